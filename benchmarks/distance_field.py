@@ -0,0 +1,85 @@
+"""
+Per-call cost of KnowlageBase.path_distance (the team's distance field of a target) against A* from scratch,
+on the knowledge bases of a seeded headless game, and a check that the distances are right.
+
+Every `--every` ticks, for every living agent and both flags its team knows of:
+    - the distance to the flag has to be finite whenever a cell next to the flag can be reached. The friendly
+      flag is an obstacle in pathfinding_world while the team doesn't hold the enemy flag, the distance
+      to it is the one to its nearest neighbour plus 1
+    - it has to be the cost of the A* path to that neighbour plus 1
+
+Usage:
+    python benchmarks/distance_field.py --seed 1 --ticks 3000
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pathfinding_agent import astar_array, STEP_EXTRA_COST
+import blue_agent
+import headless
+import red_agent
+
+import argparse
+import math
+import statistics
+import time
+
+
+def path_cost(grid, path):
+    return sum(1 + STEP_EXTRA_COST[grid[row][col]] for row, col in path[1:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and check the distance fields of a game.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--ticks", type=int, default=3000)
+    parser.add_argument("--every", type=int, default=100, help="ticks between samples")
+    args = parser.parse_args()
+
+    field_samples, astar_samples, errors = [], [], []
+
+    def sample(world):
+        if world.tick % args.every:
+            return
+        for agent in world.agents:
+            knowlage_base = (red_agent if agent.color == "red" else blue_agent).knowlage_base
+            grid = knowlage_base.pathfinding_world
+            position = (agent.position[1], agent.position[0])
+            for flag in [knowlage_base.friendly_flag_location, knowlage_base.enemy_flag_location]:
+                if flag is None or flag == position:
+                    continue
+                start = time.perf_counter()
+                distance = knowlage_base.path_distance(position, flag)
+                field_samples.append(time.perf_counter() - start)
+
+                if STEP_EXTRA_COST[grid[flag[0]][flag[1]]] is None:
+                    ends = [(flag[0] + dx, flag[1] + dy) for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]]
+                    ends = [(x, y) for x, y in ends if 0 <= x < len(grid) and 0 <= y < len(grid[0]) and STEP_EXTRA_COST[grid[x][y]] is not None]
+                    extra = 1
+                else:
+                    ends, extra = [flag], 0
+                expected = math.inf
+                start = time.perf_counter()
+                for end in ends:
+                    path = [position] if end == position else astar_array(position, end, (None, None), grid)
+                    if path:
+                        expected = min(expected, path_cost(grid, path) + extra)
+                astar_samples.append(time.perf_counter() - start)
+                if distance != expected:
+                    errors.append((world.tick, agent.color, agent.index, position, flag, distance, expected))
+
+    result = headless.run_match(seed=args.seed, max_ticks=args.ticks, on_tick=sample)
+    print(f"seed {args.seed}, {result.ticks} ticks, winner {result.winner}, {len(field_samples)} distances")
+    if field_samples:
+        print(f"path_distance: {statistics.fmean(field_samples) * 1e6:8.1f} us/call")
+        print(f"astar:         {statistics.fmean(astar_samples) * 1e6:8.1f} us/call")
+    if errors:
+        for error in errors[:10]:
+            print("tick {} {} {}: {} -> {} distance {} expected {}".format(*error))
+        sys.exit(f"{len(errors)} distances differ from A*")
+
+
+if __name__ == "__main__":
+    main()
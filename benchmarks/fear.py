@@ -0,0 +1,90 @@
+"""
+Per-call cost of A* with enemies over a long game: the fear summed over every enemy sighting the team ever
+made (what the agents passed before, a list that grows all game) against the precomputed FearField of the
+recent enemies (KnowlageBase.fear_field).
+
+The red team's knowledge base is sampled every `--every` ticks of a seeded headless game, and the same
+seeded path requests are timed with both.
+
+Usage:
+    python benchmarks/fear.py --seed 1 --ticks 3000
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowlage_base import KnowlageBase
+from pathfinding_agent import astar_array
+import headless
+import red_agent
+
+import argparse
+import random
+import statistics
+import time
+
+
+def timed_mean(call, setups):
+    samples = []
+    for setup in setups:
+        start = time.perf_counter()
+        call(*setup)
+        samples.append(time.perf_counter() - start)
+    return statistics.fmean(samples) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark A* with enemy fear over a long game.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--ticks", type=int, default=3000)
+    parser.add_argument("--every", type=int, default=250, help="ticks between samples")
+    parser.add_argument("--calls", type=int, default=20, help="A* calls per sample")
+    args = parser.parse_args()
+
+    # every enemy tile seen by a red agent, duplicates included, like the old all_enemy_location
+    sightings = []
+    update = KnowlageBase.update_general_knowlage_base
+
+    def recording_update(self, visible_range, agent_pos_row, agent_pos_col, current_vision):
+        update(self, visible_range, agent_pos_row, agent_pos_col, current_vision)
+        if self is red_agent.knowlage_base:
+            for i, row in enumerate(current_vision):
+                for j, tile in enumerate(row):
+                    if tile == self.enemy[0]:
+                        sightings.append((agent_pos_row + i - 4, agent_pos_col + j - 4))
+    KnowlageBase.update_general_knowlage_base = recording_update
+
+    rows = []
+
+    def sample(world):
+        if world.tick % args.every:
+            return
+        knowlage_base = red_agent.knowlage_base
+        grid = knowlage_base.pathfinding_world
+        rng = random.Random(args.seed + world.tick)
+        cells = [(row, col) for row in range(len(grid)) for col in range(len(grid[0])) if grid[row][col] == 0]
+        if not cells:
+            return
+        setups = [(rng.choice(cells), rng.choice(cells)) for _ in range(args.calls)]
+
+        start = time.perf_counter()
+        knowlage_base.current_fear_field = None
+        field = knowlage_base.fear_field()
+        build = (time.perf_counter() - start) * 1e6
+        history = list(sightings) if sightings else (None, None)
+        legacy = timed_mean(lambda a, b: astar_array(a, b, history, grid), setups)
+        precomputed = timed_mean(lambda a, b: astar_array(a, b, field, grid), setups)
+        rows.append((world.tick, len(sightings), len(field), legacy, precomputed, build))
+
+    result = headless.run_match(seed=args.seed, max_ticks=args.ticks, on_tick=sample)
+    KnowlageBase.update_general_knowlage_base = update
+
+    print(f"seed {args.seed}, {result.ticks} ticks, winner {result.winner}")
+    print(f"{'tick':>6} {'sightings':>10} {'recent':>7} {'all sightings us':>17} {'fear field us':>14} {'field build us':>15}")
+    for tick, total, recent, legacy, precomputed, build in rows:
+        print(f"{tick:>6} {total:>10} {recent:>7} {legacy:>17.1f} {precomputed:>14.1f} {build:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Scaling of hierarchical pathfinding (hpa.py) against A* over the whole grid (astar_array), across map sizes.
+
+For every size a seeded pathfinding world is generated: walls at `--density`, the left `--explored` part of
+the map known and the rest unknown, like a team's knowledge base halfway through a game. It reports
+
+    astar        per-call latency of A* between random reachable cells
+    build        building the cluster graph from scratch
+    hpa          per-call latency of ClusterGraph.path on the built graph
+    incremental  ClusterGraph.path right after a 9x9 window of unknown cells was revealed (what an agent
+                 sees in one tick), which rebuilds only the clusters the window touched
+    cost ratio   cost of walking to the target by taking the first step of a new hierarchical path on every
+                 step, over the cost of the optimal path
+
+Usage:
+    python benchmarks/hpa.py
+    python benchmarks/hpa.py --sizes 100x200 400x800 --calls 20 --walks 5
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hpa import ClusterGraph
+from pathfinding_agent import astar_array, STEP_EXTRA_COST
+from reachability import ReachabilityIndex
+
+import argparse
+import random
+import statistics
+import time
+
+SIZES = ["24x52", "48x104", "100x200", "200x400", "400x800"]
+
+
+def generate(height, width, density, explored, rng):
+    # the whole map with walls, and what a team knows of it
+    world = [[1 if rng.random() < density else 0 for _ in range(width)] for _ in range(height)]
+    known = int(width * explored)
+    grid = [[value if col < known else -1 for col, value in enumerate(row)] for row in world]
+    return world, grid
+
+
+def timed_ms(call, setups):
+    samples = []
+    for setup in setups:
+        start = time.perf_counter()
+        call(*setup)
+        samples.append(time.perf_counter() - start)
+    return statistics.fmean(samples) * 1e3
+
+
+def path_cost(grid, path):
+    return sum(1 + STEP_EXTRA_COST[grid[row][col]] for row, col in path[1:])
+
+
+def walk_cost(graph, grid, start, target):
+    position, cost = start, 0
+    while position != target:
+        position = graph.path(position, target)[1]
+        cost += 1 + STEP_EXTRA_COST[grid[position[0]][position[1]]]
+    return cost
+
+
+def bench_size(height, width, args):
+    rng = random.Random(args.seed)
+    world, grid = generate(height, width, args.density, args.explored, rng)
+    reachability = ReachabilityIndex(grid)
+    cells = [(row, col) for row in range(height) for col in range(width) if grid[row][col] != 1]
+    pairs = []
+    while len(pairs) < args.calls:
+        start, target = rng.choice(cells), rng.choice(cells)
+        if start != target and reachability.reachable(start, target):
+            pairs.append((start, target))
+
+    result = {"astar": timed_ms(lambda a, b: astar_array(a, b, (None, None), grid), pairs)}
+    graph = ClusterGraph(grid, args.cluster_size)
+    result["build"] = timed_ms(graph.update, [()])
+    result["hpa"] = timed_ms(graph.path, pairs)
+
+    # reveal a window of the unknown part of the map before every call
+    unknown = [(row, col) for row in range(height) for col in range(width) if grid[row][col] == -1]
+    samples = []
+    for start, target in pairs:
+        if unknown:
+            center = rng.choice(unknown)
+            for row in range(max(0, center[0] - 4), min(height, center[0] + 5)):
+                for col in range(max(0, center[1] - 4), min(width, center[1] + 5)):
+                    if grid[row][col] != world[row][col]:
+                        grid[row][col] = world[row][col]
+                        graph.cell_changed((row, col))
+                        reachability.cell_changed((row, col))
+        if not reachability.reachable(start, target):
+            continue
+        begin = time.perf_counter()
+        graph.path(start, target)
+        samples.append(time.perf_counter() - begin)
+    result["incremental"] = statistics.fmean(samples) * 1e3 if samples else float("nan")
+
+    ratios = []
+    for start, target in pairs[:args.walks]:
+        if reachability.reachable(start, target):
+            ratios.append(walk_cost(graph, grid, start, target) / path_cost(grid, astar_array(start, target, (None, None), grid)))
+    result["cost_ratio"] = statistics.fmean(ratios) if ratios else float("nan")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hierarchical pathfinding across map sizes.")
+    parser.add_argument("--sizes", nargs="+", default=SIZES, help="map sizes as HEIGHTxWIDTH")
+    parser.add_argument("--density", type=float, default=0.3, help="wall density")
+    parser.add_argument("--explored", type=float, default=0.5, help="part of the map the team knows")
+    parser.add_argument("--cluster-size", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--calls", type=int, default=10, help="path requests per size")
+    parser.add_argument("--walks", type=int, default=3, help="requests walked to the target for the cost ratio")
+    args = parser.parse_args()
+
+    print(f"{'size':>9} {'astar ms':>9} {'build ms':>9} {'hpa ms':>7} {'incremental ms':>15} {'cost ratio':>11}")
+    for size in args.sizes:
+        height, width = (int(value) for value in size.split("x"))
+        result = bench_size(height, width, args)
+        print(f"{size:>9} {result['astar']:>9.1f} {result['build']:>9.1f} {result['hpa']:>7.2f} "
+              f"{result['incremental']:>15.2f} {result['cost_ratio']:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
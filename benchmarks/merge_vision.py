@@ -0,0 +1,120 @@
+"""
+Per-call cost of merging an agent's vision into its team's knowledge base with numpy
+(KnowlageBase.merge_vision_numpy) against the cell by cell loop (KnowlageBase.merge_vision),
+on the visions of a seeded headless game, and a check that both leave the same knowledge base.
+The game itself alternates between the two merges, that is what is timed. It decides whether
+knowlage_base.MERGE_VISION_NUMPY is worth setting.
+
+Every time an agent merges its vision, both merges run on copies of the team's knowledge base and have to agree on:
+    - knowlage_base, terrain, danger, pathfinding_world, the flags and the regroup spot
+    - transients and the sightings of enemy_tracker, in the same order
+    - the cells the path caches are told about, in the same order
+    - the change set of the tick (discovered cells, costs, flags, sightings)
+Every `--foreign` merges one visible tile is also swapped for a character outside ascii, which neither merge knows.
+
+Usage:
+    python benchmarks/merge_vision.py --seed 1 --ticks 3000
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import knowlage_base as module
+import headless
+
+import argparse
+import copy
+import random
+import statistics
+import time
+
+STATE = ["knowlage_base", "terrain", "danger", "pathfinding_world", "enemy_flag_location",
+         "friendly_flag_location", "reserve_regrup_spot", "frame"]
+FOREIGN_TILES = ["é", "€", "\U0001F6A9"]
+
+
+class Notifications:
+    def __init__(self):
+        self.cells = []
+
+    def cell_changed(self, cell):
+        self.cells.append(cell)
+
+
+def merged(knowlage_base, vectorised, vision):
+    # merges `vision` into a copy of the knowledge base, returns what it left
+    shadow = copy.copy(knowlage_base)
+    for attribute in STATE + ["transients", "enemy_tracker", "changes"]:
+        setattr(shadow, attribute, copy.deepcopy(getattr(knowlage_base, attribute)))
+    notifications = Notifications()
+    shadow.path_caches = [notifications]
+    module.MERGE_VISION_NUMPY = vectorised
+    try:
+        original_update(shadow, *vision)
+    finally:
+        module.MERGE_VISION_NUMPY = False
+    changes = shadow.changes
+    state = [getattr(shadow, attribute) for attribute in STATE] + [
+        list(shadow.transients.items()), list(shadow.enemy_tracker.last_seen.items()), notifications.cells,
+        changes.discovered, list(changes.costs.items()), changes.flags, changes.sightings]
+    return state
+
+
+original_update = module.KnowlageBase.update_general_knowlage_base
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and check the numpy vision merge.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--ticks", type=int, default=3000)
+    parser.add_argument("--foreign", type=int, default=10, help="merges between visions with a tile outside ascii")
+    args = parser.parse_args()
+    if module.np is None:
+        sys.exit("numpy is not installed, there is only the loop")
+
+    rng = random.Random(args.seed)
+    loop_samples, numpy_samples, errors = [], [], []
+    merges = [0]
+
+    def checked_update(knowlage_base, visible_range, agent_pos_row, agent_pos_col, current_vision):
+        merges[0] += 1
+        visions = [current_vision]
+        if merges[0] % args.foreign == 0:
+            foreign = [list(row) for row in current_vision]
+            cells = [(i, j) for i, row in enumerate(foreign) for j, tile in enumerate(row) if tile != "/"]
+            i, j = rng.choice(cells)
+            foreign[i][j] = rng.choice(FOREIGN_TILES)
+            visions.append(foreign)
+        for vision in visions:
+            arguments = (visible_range, agent_pos_row, agent_pos_col, vision)
+            if merged(knowlage_base, True, arguments) != merged(knowlage_base, False, arguments):
+                errors.append((knowlage_base.frame, agent_pos_row, agent_pos_col, vision is not current_vision))
+
+        samples = numpy_samples if merges[0] % 2 else loop_samples
+        module.MERGE_VISION_NUMPY = samples is numpy_samples
+        try:
+            start = time.perf_counter()
+            original_update(knowlage_base, visible_range, agent_pos_row, agent_pos_col, current_vision)
+            samples.append(time.perf_counter() - start)
+        finally:
+            module.MERGE_VISION_NUMPY = False
+
+    module.KnowlageBase.update_general_knowlage_base = checked_update
+    try:
+        result = headless.run_match(seed=args.seed, max_ticks=args.ticks)
+    finally:
+        module.KnowlageBase.update_general_knowlage_base = original_update
+
+    print(f"seed {args.seed}, {result.ticks} ticks, winner {result.winner}, {merges[0]} merges")
+    if loop_samples and numpy_samples:
+        print(f"loop:  {statistics.fmean(loop_samples) * 1e6:8.1f} us/call")
+        print(f"numpy: {statistics.fmean(numpy_samples) * 1e6:8.1f} us/call")
+    if errors:
+        for error in errors[:10]:
+            print("frame {} at {}, {}: differs (foreign tile: {})".format(*error))
+        sys.exit(f"{len(errors)} numpy merges differ from the loop")
+
+
+if __name__ == "__main__":
+    main()
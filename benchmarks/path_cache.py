@@ -0,0 +1,92 @@
+"""
+Checks that the paths of a PathCache (D* Lite plans and repairs, path_cache.py) cost what the paths of
+astar_array with the fear of enemies in the step cost (the fallback of PathCache.path) cost, on seeded
+random grids with every kind of cell and a few enemies.
+
+On every grid an agent walks towards a few targets while cells change under it and enemies come and go.
+Every path the cache plans or repairs (kept paths are only repaired once a change touches them) has to:
+    - be found exactly when A* finds one
+    - cost, with the fear folded in, what the path of A* costs, up to rounding
+
+Usage:
+    python benchmarks/path_cache.py --seed 1 --grids 200
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from path_cache import PathCache
+from pathfinding_agent import astar_array, FearField, STEP_EXTRA_COST
+
+import argparse
+import random
+import statistics
+import time
+
+CELLS = [0] * 6 + [1] * 2 + [2, -1]
+
+
+def path_cost(grid, fear, path):
+    cols = len(grid[0])
+    return sum(1 + STEP_EXTRA_COST[grid[row][col]] + fear[row*cols + col] for row, col in path[1:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that PathCache and A* agree on the cost of paths with enemies.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--grids", type=int, default=200)
+    parser.add_argument("--size", type=int, default=30, help="largest side of a grid")
+    parser.add_argument("--steps", type=int, default=40, help="path requests on every grid")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cache_samples, astar_samples, errors = [], [], []
+    checked = 0
+    for _ in range(args.grids):
+        rows, cols = rng.randint(4, args.size), rng.randint(4, args.size)
+        grid = [[rng.choice(CELLS) for _ in range(cols)] for _ in range(rows)]
+        cache = PathCache()
+        agent = (rng.randrange(rows), rng.randrange(cols))
+        targets = [(rng.randrange(rows), rng.randrange(cols)) for _ in range(3)]
+        enemies = []
+        for _ in range(args.steps):
+            if rng.random() < 0.3:
+                cell = (rng.randrange(rows), rng.randrange(cols))
+                grid[cell[0]][cell[1]] = rng.choice(CELLS)
+                cache.cell_changed(cell)
+            if rng.random() < 0.2:
+                enemies = [(rng.randrange(rows), rng.randrange(cols)) for _ in range(rng.randint(0, 3))]
+            field = FearField(rows, cols, enemies)
+            target = rng.choice(targets)
+            if target == agent:
+                continue
+
+            planned = cache.plans + cache.repairs
+            start = time.perf_counter()
+            got = cache.path(agent, target, grid, field)
+            cache_samples.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            expected = astar_array(agent, target, field, grid, fear_in_cost=True)
+            astar_samples.append(time.perf_counter() - start)
+
+            if cache.plans + cache.repairs > planned:
+                checked += 1
+                if bool(got) != bool(expected) or got and abs(path_cost(grid, field.values, got) - path_cost(grid, field.values, expected)) > 1e-6:
+                    errors.append((rows, cols, agent, target, len(field),
+                                   path_cost(grid, field.values, got) if got else None,
+                                   path_cost(grid, field.values, expected) if expected else None))
+            if got and len(got) > 1:
+                agent = got[min(len(got) - 1, rng.randint(1, 3))]
+
+    print(f"{len(cache_samples)} requests on {args.grids} grids of up to {args.size}x{args.size}, {checked} planned or repaired")
+    print(f"path cache: {statistics.fmean(cache_samples) * 1e6:8.1f} us/call")
+    print(f"astar:      {statistics.fmean(astar_samples) * 1e6:8.1f} us/call")
+    if errors:
+        for error in errors[:10]:
+            print("{}x{} grid, {} -> {} with {} enemies: the cached path costs {}, A* {}".format(*error))
+        sys.exit(f"{len(errors)} cached paths differ from A*")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Benchmark suite for the simulation and the agents' hot paths.
+
+For every map size and wall density it reports whole-game ticks per second (headless) and the per-call
+latency of A*, agent vision, buffering the worldmap, merging vision into the knowledge
+base (loop and numpy), refreshing enemies and moving bullets. Everything is seeded, so two runs on the same machine measure the same work.
+
+Map size is read by config.py when the modules are imported, so every size runs in its own process.
+
+Usage:
+    python benchmarks/suite.py --output bench.json
+    python benchmarks/suite.py --sizes 24x52 100x200 --densities 0.3 --match-ticks 100
+"""
+
+import os
+import sys
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+
+SIZES = ["24x52", "48x104", "100x200", "200x400"]
+DENSITIES = [0.1, 0.3]
+
+
+def summarize(samples):
+    """
+    Latency statistics of a list of call durations (seconds), in microseconds.
+    """
+    samples = sorted(samples)
+    return {
+        "calls": len(samples),
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "median_us": statistics.median(samples) * 1e6,
+        "p95_us": samples[int(len(samples) * 0.95) - 1 if len(samples) > 1 else 0] * 1e6,
+        "max_us": samples[-1] * 1e6,
+    }
+
+
+def timed(call, setups):
+    """
+    Times `call(*setup)` once for every setup (setups are built before timing starts).
+    """
+    samples = []
+    for setup in setups:
+        start = time.perf_counter()
+        call(*setup)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def empty_cells(world):
+    return [(x, y) for y in range(world.height) for x in range(world.width) if world.worldmap[y][x] == " "]
+
+
+def random_walk(world, rng, steps):
+    cells = set(empty_cells(world))
+    position = rng.choice(sorted(cells))
+    walk = []
+    for _ in range(steps):
+        x, y = position
+        neighbors = [cell for cell in [(x+1, y), (x-1, y), (x, y+1), (x, y-1)] if cell in cells]
+        if neighbors:
+            position = rng.choice(neighbors)
+        walk.append(position)
+    return walk
+
+
+def pathfinding_grid(world):
+    # what a team knows after exploring the whole map: 0 empty, 1 wall (indexed [row][col])
+    return [[1 if tile == "#" else 0 for tile in row] for row in world.worldmap]
+
+
+def bench_match(seed, max_ticks):
+    from headless import run_match
+    start = time.perf_counter()
+    result = run_match(seed=seed, max_ticks=max_ticks)
+    elapsed = time.perf_counter() - start
+    return {"ticks": result.ticks, "seconds": elapsed, "ticks_per_second": result.ticks / elapsed, "winner": result.winner}
+
+
+def bench_astar(world, rng, calls, enemies, astar):
+    grid = pathfinding_grid(world)
+    cells = [(y, x) for x, y in empty_cells(world)]
+    enemy_pos = [rng.choice(cells) for _ in range(enemies)] if enemies else (None, None)
+    setups = [(rng.choice(cells), rng.choice(cells), enemy_pos, grid) for _ in range(calls)]
+    return timed(astar, setups)
+
+
+def bench_visible_world(world, rng, calls):
+    agent = world.agents[0]
+    walk = random_walk(world, rng, calls)
+
+    def call(position):
+        agent.position = position
+        agent.get_visible_world(world)
+    return timed(call, [(position,) for position in walk])
+
+
+def bench_buffer_worldmap(world, rng, calls):
+    from tournament import Bullet
+    cells = empty_cells(world)
+    walks = [random_walk(world, rng, calls) for _ in world.agents]
+    world.bullets = [Bullet(world.agents[0], (1, 0)) for _ in range(10)]
+    setups = []
+    for i in range(calls):
+        positions = [walk[i] for walk in walks]
+        bullets = [rng.choice(cells) for _ in world.bullets]
+        setups.append((positions, bullets))
+
+    samples = []
+    world.buffer_worldmap()
+    for positions, bullets in setups:
+        for agent, position in zip(world.agents, positions):
+            agent.position = position
+        for bullet, position in zip(world.bullets, bullets):
+            bullet.position = position
+        start = time.perf_counter()
+        world.buffer_worldmap()
+        samples.append(time.perf_counter() - start)
+    world.bullets = []
+    return summarize(samples)
+
+
+def knowlage_base_with_visions(world, rng, calls):
+    import red_agent
+    from knowlage_base import KnowlageBase
+    knowlage_base = KnowlageBase(red_agent.FRIENDLY_FLAG, red_agent.ENEMY_FLAG, red_agent.ENEMY, red_agent.FRIEND)
+    agent = world.agents[0]
+    visions = []
+    for x, y in random_walk(world, rng, calls):
+        agent.position = (x, y)
+        visions.append((4, y, x, agent.get_visible_world(world)))
+    return knowlage_base, visions
+
+
+def bench_update_knowlage_base(world, rng, calls, vectorised = False):
+    import knowlage_base as module
+    knowlage_base, visions = knowlage_base_with_visions(world, rng, calls)
+    module.MERGE_VISION_NUMPY = vectorised
+    try:
+        return timed(knowlage_base.update_general_knowlage_base, visions)
+    finally:
+        module.MERGE_VISION_NUMPY = False
+
+
+def bench_refresh_enemys(world, rng, calls):
+    knowlage_base, visions = knowlage_base_with_visions(world, rng, calls * 10)
+    samples = []
+    for i in range(calls):
+        # a few agent ticks of new knowledge between refreshes, like in a game
+        for vision in visions[i*10:(i+1)*10]:
+            knowlage_base.update_general_knowlage_base(*vision)
+            knowlage_base.find_dangerous_location(vision[1], vision[2])
+        start = time.perf_counter()
+        knowlage_base.refresh_enemys()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def bench_bullet_update(world, rng, calls):
+    from tournament import Bullet
+    cells = empty_cells(world)
+    world.buffer_worldmap()
+    setups = []
+    for _ in range(calls):
+        bullet = Bullet(world.agents[0], rng.choice([(1, 0), (-1, 0), (0, 1), (0, -1)]))
+        bullet.position = rng.choice(cells)
+        setups.append((bullet,))
+
+    def call(bullet):
+        bullet.update(world.worldmap_buffer, world.agents, None, world.occupancy)
+    return timed(call, setups)
+
+
+def run_worker(args):
+    from tournament import World
+    from config import HEIGHT, WIDTH, TICK_RATE
+    import pathfinding_agent
+
+    result = {"height": HEIGHT, "width": WIDTH, "wall_density": args.density}
+    result["match"] = bench_match(args.seed, args.match_ticks)
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    world = World(HEIGHT, WIDTH, TICK_RATE, wall_density=args.density)
+    world.generate_world()
+    world.buffer_worldmap()
+
+    # same seed for the reference and the array engine, so they solve the same problems
+    for name, engine in [("astar", pathfinding_agent.astar), ("astar_array", pathfinding_agent.astar_array)]:
+        result[name] = bench_astar(world, random.Random(args.seed), args.astar_calls, 0, engine)
+        result[name + "_with_enemies"] = bench_astar(world, random.Random(args.seed + 1), args.astar_calls, 50, engine)
+    result["get_visible_world"] = bench_visible_world(world, rng, args.calls)
+    result["buffer_worldmap"] = bench_buffer_worldmap(world, rng, args.calls)
+    # same seed for the loop and the numpy merge, so they merge the same visions
+    result["update_general_knowlage_base"] = bench_update_knowlage_base(world, random.Random(args.seed + 2), args.calls)
+    if pathfinding_agent.np is not None:
+        result["update_general_knowlage_base_numpy"] = bench_update_knowlage_base(world, random.Random(args.seed + 2), args.calls, vectorised=True)
+    result["refresh_enemys"] = bench_refresh_enemys(world, rng, args.refresh_calls)
+    result["bullet_update"] = bench_bullet_update(world, rng, args.calls)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulation and the agents.")
+    parser.add_argument("--sizes", nargs="+", default=SIZES, help="map sizes as HEIGHTxWIDTH")
+    parser.add_argument("--densities", nargs="+", type=float, default=DENSITIES, help="wall densities")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--match-ticks", type=int, default=200, help="ticks of the headless game")
+    parser.add_argument("--calls", type=int, default=1000, help="calls per micro benchmark")
+    parser.add_argument("--astar-calls", type=int, default=50)
+    parser.add_argument("--refresh-calls", type=int, default=50)
+    parser.add_argument("--output", default=None, help="write the results as json to this file")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--density", type=float, default=0.3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        # agents print a lot, keep stdout for the json
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run_worker(args)
+        print(json.dumps(result))
+        return
+
+    results = []
+    for size in args.sizes:
+        height, width = size.split("x")
+        for density in args.densities:
+            env = dict(os.environ, CTF_HEIGHT=height, CTF_WIDTH=width, CTF_WALL_DENSITY=str(density))
+            command = [sys.executable, os.path.abspath(__file__), "--worker", "--density", str(density),
+                       "--seed", str(args.seed), "--match-ticks", str(args.match_ticks), "--calls", str(args.calls),
+                       "--astar-calls", str(args.astar_calls), "--refresh-calls", str(args.refresh_calls)]
+            output = subprocess.run(command, env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output)
+            results.append(result)
+
+            print(f"{height}x{width}, walls {density}: {result['match']['ticks_per_second']:.1f} ticks/s")
+            for name, stats in result.items():
+                if isinstance(stats, dict) and "mean_us" in stats:
+                    print(f"    {name:30s} mean {stats['mean_us']:10.1f} us   p95 {stats['p95_us']:10.1f} us")
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Planning cost of a team whose agents share targets: every agent with its own PathCache against the team's
+shared one (KnowlageBase.team_paths), where the D* Lite search of a target runs backwards from it and serves
+every agent going there (see path_cache.PathPlanner).
+
+Three agents walk towards their targets on a seeded map with walls, mud, unknown cells and two enemies.
+Every tick each of them reveals the 9x9 window around it (the caches are told about the cells that change)
+and asks for its path, one after another like the game does. The agents walk the same precomputed routes
+in both setups, so both plan from the same cells on the same grid. Goal overlaps:
+    - all three share a target
+    - two share a target
+    - three different targets
+Every tick both setups have to find a path for the same agents. Their costs can differ: a kept path is
+only repaired once a change touches it, and the two setups keep different paths.
+
+Usage:
+    python benchmarks/team_paths.py --seed 1 --ticks 150
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from path_cache import PathCache
+from pathfinding_agent import astar_array, FearField
+import pathfinding_stats
+
+import argparse
+import random
+import time
+
+AGENTS = 3
+CELLS = [0] * 14 + [1] * 4 + [2]
+OVERLAPS = [("all three share a target", [0, 0, 0]), ("two share a target", [0, 0, 1]), ("three different targets", [0, 1, 2])]
+
+
+def reveal(grid, world, position, caches):
+    rows, cols = len(grid), len(grid[0])
+    for row in range(max(0, position[0] - 4), min(rows, position[0] + 5)):
+        for col in range(max(0, position[1] - 4), min(cols, position[1] + 5)):
+            if grid[row][col] != world[row][col]:
+                grid[row][col] = world[row][col]
+                for cache in caches:
+                    cache.cell_changed((row, col))
+
+
+def play(world, known, fear, targets, routes, ticks, shared):
+    # returns seconds and expansions the planning of all ticks took, and which agents found a path every tick
+    grid = [row[:] for row in known]
+    caches = [PathCache(size=8)] if shared else [PathCache() for _ in range(AGENTS)]
+    seconds = expanded = 0
+    found = []
+    for tick in range(ticks):
+        positions = [route[min(tick, len(route) - 1)] for route in routes]
+        for position in positions:
+            reveal(grid, world, position, caches)
+        began, expanded_before = time.perf_counter(), pathfinding_stats.expanded_total
+        paths = [caches[0 if shared else i].path(positions[i], targets[i], grid, fear) for i in range(AGENTS)]
+        seconds += time.perf_counter() - began
+        expanded += pathfinding_stats.expanded_total - expanded_before
+        found.append([bool(path) for path in paths])
+    return seconds, expanded, found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the team's shared plans against a cache per agent.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rows", type=int, default=60)
+    parser.add_argument("--cols", type=int, default=120)
+    parser.add_argument("--ticks", type=int, default=150)
+    parser.add_argument("--unknown", type=float, default=0.3, help="part of the cells the team hasn't seen yet")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows, cols = args.rows, args.cols
+    world = [[rng.choice(CELLS) for _ in range(cols)] for _ in range(rows)]
+    known = [[-1 if rng.random() < args.unknown else cell for cell in row] for row in world]
+    fear = FearField(rows, cols, [(rng.randrange(rows), rng.randrange(cols // 3, cols * 2 // 3)) for _ in range(2)])
+
+    def open_cell(col_range):
+        while True:
+            cell = (rng.randrange(rows), rng.randrange(*col_range))
+            if world[cell[0]][cell[1]] != 1:
+                return cell
+    starts = [open_cell((0, cols // 6)) for _ in range(AGENTS)]
+    goals = [open_cell((cols * 5 // 6, cols)) for _ in range(AGENTS)]
+
+    errors = []
+    print(f"{rows}x{cols} map, {AGENTS} agents, {args.ticks} ticks")
+    print(f"{'':<26} {'own caches ms/tick':>19} {'team cache ms/tick':>19} {'own expanded/tick':>18} {'team expanded/tick':>19}")
+    for name, overlap in OVERLAPS:
+        targets = [goals[i] for i in overlap]
+        # the agents walk the routes they would take on the whole map, the same in both setups
+        routes = [astar_array(start, target, fear, world, fear_in_cost=True) or [start] for start, target in zip(starts, targets)]
+        own_seconds, own_expanded, own_found = play(world, known, fear, targets, routes, args.ticks, False)
+        team_seconds, team_expanded, team_found = play(world, known, fear, targets, routes, args.ticks, True)
+        if own_found != team_found:
+            errors.append(name)
+        print(f"{name:<26} {own_seconds / args.ticks * 1e3:>19.2f} {team_seconds / args.ticks * 1e3:>19.2f} "
+              f"{own_expanded / args.ticks:>18.0f} {team_expanded / args.ticks:>19.0f}")
+    if errors:
+        sys.exit(f"the team cache and the own caches differ in which agents find a path: {', '.join(errors)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Per-call cost of an agent's vision: the original Bresenham walk (vision.reference_visible_world)
+against the cached visibility masks (vision.VisionCache), on the same seeded world.
+
+Usage:
+    python benchmarks/vision.py --seed 1 --repeat 5
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tournament import World
+from vision import VisionCache, reference_visible_world
+from config import *
+
+import argparse
+import random
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark agent vision.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    world = World(HEIGHT, WIDTH, TICK_RATE)
+    world.generate_world()
+    world.buffer_worldmap()
+    positions = [(x, y) for y in range(world.height) for x in range(world.width) if not world.is_wall(x, y)]
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        expected = [reference_visible_world(world.worldmap_buffer, world.width, world.height, position) for position in positions]
+    reference = (time.perf_counter() - start) / (args.repeat * len(positions))
+
+    start = time.perf_counter()
+    cache = VisionCache(world.worldmap)
+    for position in positions:
+        cache.visible_rows(position)
+    build = (time.perf_counter() - start) / len(positions)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        got = [cache.visible_world(position, world.worldmap_buffer) for position in positions]
+    cached = (time.perf_counter() - start) / (args.repeat * len(positions))
+
+    if got != expected:
+        sys.exit("cached vision differs from the reference")
+
+    print(f"{len(positions)} positions on a {world.height}x{world.width} map")
+    print(f"reference:  {reference * 1e6:8.1f} us/call")
+    print(f"cached:     {cached * 1e6:8.1f} us/call  ({reference / cached:.1f}x faster)")
+    print(f"mask build: {build * 1e6:8.1f} us/position (once per position)")
+
+
+if __name__ == "__main__":
+    main()
@@ -46,9 +46,13 @@ Agents are using action to declare if they are moving or shooting and direction
 
 import random
 from config import *  # contains, amongst other variables, `ASCII_TILES` (which will probably be useful here)
-from pathfinding_agent import pathfinding_direction
+from pathfinding_agent import pathfinding_direction, decision_budget
+from path_cache import PathCache
+import pathfinding_stats
+import team_hooks
 from knowlage_base import KnowlageBase
 import math
+import time
 
 FRIENDLY_FLAG = ASCII_TILES["blue_flag"]
 ENEMY_FLAG = ASCII_TILES["red_flag"]
@@ -74,6 +78,8 @@ class Agent:
         self.waypoint = None
         self.holding_flag = False
         self.random_position_counter = 0
+        self.path_cache = PathCache()
+        knowlage_base.register_path_cache(self.path_cache)
 
     def shoot(self, agent_pos_row, agent_pos_col, enemys):
         """
@@ -164,6 +170,41 @@ class Agent:
 
         return action, direction
 
+    def path_direction(self, agent_pos, target_pos, pathfinding_world, all_enemys, shared = False, call_site = None):
+        """
+        Direction of the next step towards the target (see pathfinding_direction), using the agent's path cache
+        and the team's reachability index, so targets that can't be reached are given up on without a search.
+        All the searches of a decision share its budget (see update and decision_budget), once it runs out
+        they head towards the best node they got to.
+        On big maps the path goes through the team's cluster graph instead (see hpa.py).
+        While pathfinding_stats is enabled the call is recorded under `call_site` and the agent.
+
+        Args:
+            agent_pos (tuple of ints): Row and column index of agent position in pathfinding world
+            target_pos (tuple of ints): Row and column index of the target in pathfinding world
+            pathfinding_world (list of lists / matrix): Shared knowledge base matrix
+            all_enemys (FearField):  Fear of the enemies recently detected and stored in knowledge base
+            shared (bool): True for targets every agent of the team goes to (flags, corners, regroup spot),
+                           the team's distance fields are used for them, or with enemies around the team's
+                           plans, one search per target for all agents (see path_cache.PathPlanner)
+            call_site (str): what the agent is planning for, like "search/corner" or "regroup"
+
+        Returns:
+            direction (str) : "up","down","left" or "right", None if there is no path to the target
+        """
+        fields = knowlage_base.distance_fields if shared else None
+        cache = knowlage_base.team_paths if shared else self.path_cache
+        stats = pathfinding_stats.active
+        if stats is None:
+            return pathfinding_direction(agent_pos, target_pos, pathfinding_world, all_enemys, cache, fields, knowlage_base.reachability,
+                                         max_expansions=self.budget.expansions(), deadline=self.budget.deadline, hierarchy=knowlage_base.hierarchy)
+        stats.begin()
+        start = time.perf_counter()
+        direction = pathfinding_direction(agent_pos, target_pos, pathfinding_world, all_enemys, cache, fields, knowlage_base.reachability,
+                                          max_expansions=self.budget.expansions(), deadline=self.budget.deadline, hierarchy=knowlage_base.hierarchy)
+        stats.record(call_site, f"{self.color} {self.index}", direction, time.perf_counter() - start)
+        return direction
+
     def defend_flag(self, agent_pos_row, agent_pos_col, flag, pathfinding_world, all_enemys):
         """
         Function that is used to position the agent in the defending position of its own flag.
@@ -175,8 +216,8 @@ class Agent:
             flag (tuple of ints):  The tuple of row and column indexes representing the position of flag
                                     in pathfinding world
             pathfinding_world (list of lists / matrix): Shared knowledge base matrix
-            all_enemys (list of tuples):  List of tuples represented as positions of all enemies
-                                            detected and stored in knowledge base
+            all_enemys (FearField):  Fear of the enemies recently detected and stored in knowledge base,
+                                        see KnowlageBase.fear_field
 
         Returns:
             action (str) : "move" as an indicator for agent to move
@@ -189,7 +230,7 @@ class Agent:
         if (agent_pos_row, agent_pos_col) == self.waypoint or self.waypoint == None:
             self.waypoint = random.choice(waypoints)
 
-        direction = pathfinding_direction((agent_pos_row, agent_pos_col), self.waypoint, pathfinding_world, all_enemys)
+        direction = self.path_direction((agent_pos_row, agent_pos_col), self.waypoint, pathfinding_world, all_enemys, call_site="defend_flag")
         action = "move"
         return action, direction
 
@@ -204,8 +245,8 @@ class Agent:
             agent_pos_row (int): Row index of agent position in pathfinding world
             agent_pos_col (int): Column index of agent position in pathfinding world
             pathfinding_world (list of lists / matrix): Shared knowledge base matrix
-            all_enemys (list of tuples):  List of tuples represented as positions of all enemies
-                                            detected and stored in knowledge base
+            all_enemys (FearField):  Fear of the enemies recently detected and stored in knowledge base,
+                                        see KnowlageBase.fear_field
 
         Returns:
             action (str) : "move" as an indicator for agent to move
@@ -220,48 +261,54 @@ class Agent:
         if self.index == 1:
             if not self.down_corner_visited:
                 action = "move"
-                direction = pathfinding_direction((agent_pos_row, agent_pos_col), DOWN_CORNER, pathfinding_world, all_enemys)
+                direction = self.path_direction((agent_pos_row, agent_pos_col), DOWN_CORNER, pathfinding_world, all_enemys, shared=True, call_site="search/corner")
             elif self.waypoint != None:
                 action = "move"
-                direction = pathfinding_direction((agent_pos_row, agent_pos_col), self.waypoint, pathfinding_world, all_enemys)
+                direction = self.path_direction((agent_pos_row, agent_pos_col), self.waypoint, pathfinding_world, all_enemys, call_site="search/waypoint")
                 if (agent_pos_row, agent_pos_col) == self.waypoint or direction == None:
                     self.waypoint = None
             elif self.random_position_counter < 10:
-                while direction == None:
-                    row, col = random_left_middle_position()
+                # new waypoints are tried while the decision has budget left for their searches
+                while direction == None and not self.budget.exhausted():
+                    row, col = random_left_middle_position((agent_pos_row, agent_pos_col), self.budget.expansions(), self.budget.deadline)
+                    if row == None:
+                        break
                     self.waypoint = (row, col)
                     action = "move"
-                    direction = pathfinding_direction((agent_pos_row, agent_pos_col), self.waypoint, pathfinding_world, all_enemys)
+                    direction = self.path_direction((agent_pos_row, agent_pos_col), self.waypoint, pathfinding_world, all_enemys, call_site="search/new_waypoint")
                 self.random_position_counter += 1
             else:
                 action = "move"
-                direction = pathfinding_direction((agent_pos_row, agent_pos_col), UP_CORNER, pathfinding_world, all_enemys)
+                direction = self.path_direction((agent_pos_row, agent_pos_col), UP_CORNER, pathfinding_world, all_enemys, shared=True, call_site="search/corner")
                 self.random_position_counter = 0
 
         if self.index == 2:
             if not self.up_corner_visited:
                 action = "move"
-                direction = pathfinding_direction((agent_pos_row, agent_pos_col), UP_CORNER, pathfinding_world, all_enemys)
+                direction = self.path_direction((agent_pos_row, agent_pos_col), UP_CORNER, pathfinding_world, all_enemys, shared=True, call_site="search/corner")
             elif self.waypoint != None:
                 action = "move"
-                direction = pathfinding_direction((agent_pos_row, agent_pos_col), self.waypoint, pathfinding_world, all_enemys)
+                direction = self.path_direction((agent_pos_row, agent_pos_col), self.waypoint, pathfinding_world, all_enemys, call_site="search/waypoint")
                 if (agent_pos_row, agent_pos_col) == self.waypoint or direction == None:
                     self.waypoint = None
             elif self.random_position_counter < 10:
-                while direction == None:
-                    row, col = random_left_middle_position()
+                # new waypoints are tried while the decision has budget left for their searches
+                while direction == None and not self.budget.exhausted():
+                    row, col = random_left_middle_position((agent_pos_row, agent_pos_col), self.budget.expansions(), self.budget.deadline)
+                    if row == None:
+                        break
                     self.waypoint = (row, col)
                     action = "move"
-                    direction = pathfinding_direction((agent_pos_row, agent_pos_col), self.waypoint, pathfinding_world, all_enemys)
+                    direction = self.path_direction((agent_pos_row, agent_pos_col), self.waypoint, pathfinding_world, all_enemys, call_site="search/new_waypoint")
                 self.random_position_counter += 1
             else:
                 action = "move"
-                direction = pathfinding_direction((agent_pos_row, agent_pos_col), DOWN_CORNER, pathfinding_world, all_enemys)
+                direction = self.path_direction((agent_pos_row, agent_pos_col), DOWN_CORNER, pathfinding_world, all_enemys, shared=True, call_site="search/corner")
                 self.random_position_counter = 0
 
         return action, direction
 
-    def go_to_position(self, agent_pos_row, agent_pos_col, position, pathfinding_world, all_enemys):
+    def go_to_position(self, agent_pos_row, agent_pos_col, position, pathfinding_world, all_enemys, call_site = "go_to_position"):
         """
         Moves the agent to the next position according to the direction of the calculated path to the flag
 
@@ -271,14 +318,15 @@ class Agent:
             flag (tuple of ints):  The tuple of row and column indexes representing the position of flag
                                     in pathfinding world
             pathfinding_world ( list of lists / matrix): Shared knowledge base matrix
-            all_enemys (list of tuples):  List of tuples represented as positions of all enemies
-                                            detected and stored in knowledge base
+            all_enemys (FearField):  Fear of the enemies recently detected and stored in knowledge base,
+                                        see KnowlageBase.fear_field
+            call_site (str): what the agent is going there for, see path_direction
 
         Returns:
             action (str) : "move" as an indicator for agent to move
             direction (str) : "up","down","left" or "right" for the direction to move towards the path to flag
         """
-        direction = pathfinding_direction((agent_pos_row, agent_pos_col), position, pathfinding_world, all_enemys)
+        direction = self.path_direction((agent_pos_row, agent_pos_col), position, pathfinding_world, all_enemys, shared=True, call_site=call_site)
         action = "move"
         return action, direction
     
@@ -316,6 +364,8 @@ class Agent:
 
         knowlage_base.update_general_knowlage_base(self.visible_range, agent_pos_row, agent_pos_col, visible_world)
         knowlage_base.find_dangerous_location(agent_pos_row, agent_pos_col)
+        # every search of this decision takes from the same budget (see path_direction)
+        self.budget = decision_budget()
         
         # VARS - KNOWLAGE BASE
         pathfinding_world = knowlage_base.pathfinding_world
@@ -324,7 +374,7 @@ class Agent:
         regruped = knowlage_base.regruped
         close_bullets = knowlage_base.bullet_locations(agent_pos_row, agent_pos_col)
         close_enemys = knowlage_base.enemy_locations(agent_pos_row, agent_pos_col)
-        all_enemys = knowlage_base.all_enemy_location
+        all_enemys = knowlage_base.fear_field()
         defender_alive = knowlage_base.defend_agent
         attacker1_alive = knowlage_base.attack_agent1
         attacker2_alive = knowlage_base.attack_agent2
@@ -378,7 +428,7 @@ class Agent:
                 knowlage_base.update_agent_action(self.index, "regrup_action")
                 if knowlage_base.regrup_spot == None:
                     knowlage_base.find_regrup_spot(enemy_flag)
-                action, direction = self.go_to_position(agent_pos_row, agent_pos_col, knowlage_base.regrup_spot, pathfinding_world, all_enemys)
+                action, direction = self.go_to_position(agent_pos_row, agent_pos_col, knowlage_base.regrup_spot, pathfinding_world, all_enemys, call_site="regroup")
                 if (agent_pos_row, agent_pos_col) == knowlage_base.regrup_spot:
                     knowlage_base.at_positon(self.index)
 
@@ -405,7 +455,7 @@ class Agent:
                 knowlage_base.update_agent_action(self.index, "regrup_action")
                 if knowlage_base.regrup_spot == None:
                     knowlage_base.find_regrup_spot(enemy_flag)
-                action, direction = self.go_to_position(agent_pos_row, agent_pos_col, knowlage_base.regrup_spot, pathfinding_world, all_enemys)
+                action, direction = self.go_to_position(agent_pos_row, agent_pos_col, knowlage_base.regrup_spot, pathfinding_world, all_enemys, call_site="regroup")
                 if (agent_pos_row, agent_pos_col) == knowlage_base.regrup_spot:
                     knowlage_base.at_positon(self.index)
                 print(direction)
@@ -439,7 +489,8 @@ class Agent:
         elif flage_in_danger_action:
             knowlage_base.update_agent_action(self.index, "flage_in_danger_action")
             knowlage_base.defend_cooldown -= 1
-            if enemy_flag != None and math.dist((agent_pos_row, agent_pos_col), enemy_flag ) < math.dist((agent_pos_row, agent_pos_col), friendly_flag) and not holding_flag:
+            if enemy_flag != None and knowlage_base.path_distance((agent_pos_row, agent_pos_col), enemy_flag, self.budget.expansions(), self.budget.deadline) \
+            < knowlage_base.path_distance((agent_pos_row, agent_pos_col), friendly_flag, self.budget.expansions(), self.budget.deadline) and not holding_flag:
                 action, direction = self.go_to_position(agent_pos_row, agent_pos_col, enemy_flag, pathfinding_world, all_enemys)
             else:
                 action, direction = self.defend_flag(agent_pos_row, agent_pos_col, friendly_flag, pathfinding_world, all_enemys)
@@ -458,13 +509,35 @@ class Agent:
                 knowlage_base.holding_flag = False
             print(self.color, self.index, "died")
 
-def random_left_middle_position():
+def reset_knowlage_base():
+    """
+    Prepares the team for a new game: fresh shared knowledge base and frame counter.
+    Without this a second game in the same interpreter would start with the old game's knowledge.
+    """
+    global knowlage_base, FRAME
+    knowlage_base = KnowlageBase(FRIENDLY_FLAG, ENEMY_FLAG, ENEMY, FRIEND)
+    FRAME = 0
+
+def publish_knowlage(tick):
+    """
+    Hands what the team learned this tick to the subscribers of its knowledge base (see KnowlageBase.publish_changes)
+    """
+    knowlage_base.publish_changes(tick)
+
+team_hooks.register("blue", new_match=reset_knowlage_base, agent_tick_done=publish_knowlage)
+
+def random_left_middle_position(agent_pos = None, max_expansions = None, deadline = None):
     """
     Calculates a random position on the other side of map for where the agents need to go after they reach corners
 
+    Args:
+        agent_pos (tuple of ints): if given, only positions the agent can reach are picked (see ReachabilityIndex)
+        max_expansions (int): most cells the rebuild of the reachability index may fill, None for no limit
+        deadline (float): time.perf_counter() the rebuild has to stop at, None for no limit
+
     Returns:
-        random_row (int): index for row in pathfinding world
-        random_col (int): index for column in pathfinding world
+        random_row (int): index for row in pathfinding world, None if no position can be reached
+        random_col (int): index for column in pathfinding world, None if no position can be reached
     """
     # Defining the left middle part
     # Horizontal: Left half of the matrix
@@ -475,6 +548,11 @@ def random_left_middle_position():
     row_start = HEIGHT // 3
     row_end = HEIGHT * 2 // 3
 
+    if agent_pos != None:
+        position = knowlage_base.reachability.random_position(agent_pos, range(row_start, row_end), range(col_start, col_end),
+                                                              max_expansions=max_expansions, deadline=deadline)
+        return position if position else (None, None)
+
     # Generating a random position within the left middle part
     random_row = random.randint(row_start, row_end - 1)
     random_col = random.randint(col_start, col_end - 1)
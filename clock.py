@@ -0,0 +1,41 @@
+import time
+
+
+class RealTimeClock:
+    """
+    Waits `tick_rate` seconds of wall-clock time between ticks (the behaviour of the pygame game).
+    """
+
+    def __init__(self, tick_rate):
+        self.tick_rate = tick_rate
+        self.time = 0.0
+
+    def tick(self):
+        time.sleep(self.tick_rate)
+        self.time += self.tick_rate
+
+
+class FixedStepClock:
+    """
+    Advances simulated time by a fixed `step` per tick without waiting.
+    Useful when something downstream needs a game time but not real time.
+    """
+
+    def __init__(self, step):
+        self.step = step
+        self.time = 0.0
+
+    def tick(self):
+        self.time += self.step
+
+
+class FastClock:
+    """
+    Runs the simulation as fast as possible. Time is simply the number of ticks.
+    """
+
+    def __init__(self):
+        self.time = 0
+
+    def tick(self):
+        self.time += 1
@@ -1,5 +1,13 @@
-HEIGHT = 24 #24
-WIDTH = 52 #32
+from os import environ as _environ
+
+# map size and wall density can be overridden from the environment (benchmarks run bigger arenas)
+HEIGHT = int(_environ.get("CTF_HEIGHT", 24)) #24
+WIDTH = int(_environ.get("CTF_WIDTH", 52)) #32
+WALL_DENSITY = float(_environ.get("CTF_WALL_DENSITY", 0.3))
 TICK_RATE = 0.01 #0.01
 
 ASCII_TILES = {"empty": " ", "wall": "#", "blue_agent": "b", "red_agent": "r", "blue_agent_f": "B", "red_agent_f": "R", "blue_flag": "{", "red_flag": "}", "bullet": ".", "unknown": "/"}
+
+# one byte per tile for compact storage (replays, numpy grids), codes follow the order of ASCII_TILES
+TILE_CODES = {tile: code for code, tile in enumerate(ASCII_TILES.values())}
+CODE_TILES = list(ASCII_TILES.values())
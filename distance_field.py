@@ -0,0 +1,181 @@
+import heapq
+import itertools
+import math
+import time
+import pathfinding_stats
+from collections import OrderedDict
+from pathfinding_agent import STEP_EXTRA_COST, neighbor_table
+
+
+class DistanceField:
+    """
+    Cost of the cheapest path from every cell of the grid to `target` (a flow field), from one Dijkstra search
+    backwards from the target over the terrain costs of pathfinding_world (fear of enemies is not part of it).
+    The target may be an obstacle (the team's own flag is one), its neighbours are then 1 away from it.
+    It is rebuilt lazily: a changed cell only marks it dirty, the search runs again the next time it is read.
+    The search can be given a budget, a field that isn't done yet is continued by the next call.
+
+    Args:
+        target ( tuple ): row, col of the target
+        grid ( list of lists ): pathfinding world
+    """
+
+    def __init__(self, target, grid):
+        self.target = target
+        self.grid = grid
+        self.rows = len(grid)
+        self.cols = len(grid[0])
+        self.dist = None  # indexed row*cols + col
+        self.cells = None
+        self.open_set = None
+        self.dirty = True
+        self.complete = False
+        self.builds = 0
+
+    def cell_changed(self, cell):
+        self.dirty = True
+
+    def build(self, max_expansions = None, deadline = None):
+        """
+        Runs the search, from the start if the grid changed since it began.
+
+        Args:
+            max_expansions ( int ): most cells to expand, None for no limit
+            deadline ( float ): time.perf_counter() to stop at, None for no limit
+
+        Returns:
+            bool: True if the field is done
+        """
+        cols = self.cols
+        goal = self.target[0]*cols + self.target[1]
+        if self.dirty:
+            self.cells = list(itertools.chain.from_iterable(self.grid))
+            self.dist = [math.inf] * len(self.cells)
+            self.dist[goal] = 0
+            self.open_set = [(0, goal)]
+            self.dirty = False
+            self.complete = False
+        cells, dist, open_set = self.cells, self.dist, self.open_set
+        neighbors = neighbor_table(self.rows, cols)
+        heappush, heappop = heapq.heappush, heapq.heappop
+        expansions = pushes = 0
+
+        # dist[u] = cost of stepping onto v + dist[v] for the best neighbour v of u
+        while open_set:
+            if max_expansions is not None and expansions >= max_expansions \
+            or deadline is not None and expansions % 64 == 0 and time.perf_counter() > deadline:
+                self._report(expansions, pushes)
+                return False
+            expansions += 1
+            current_dist, current = heappop(open_set)
+            if current_dist > dist[current]:
+                continue
+            extra = STEP_EXTRA_COST[cells[current]]
+            if extra is None:
+                if current != goal:
+                    continue  # obstacles can't be stepped on, no path goes through them
+                extra = 0  # paths to an obstacle end next to it
+            step_dist = current_dist + 1 + extra
+            for neighbor in neighbors[current]:
+                if step_dist < dist[neighbor]:
+                    dist[neighbor] = step_dist
+                    heappush(open_set, (step_dist, neighbor))
+                    pushes += 1
+
+        self.complete = True
+        self.builds += 1
+        self._report(expansions, pushes)
+        return True
+
+    def _report(self, expansions, pushes):
+        pathfinding_stats.searched(expansions, pushes)
+
+    def update(self, max_expansions = None, deadline = None):
+        """
+        Returns:
+            bool: True if the field is up to date, see build
+        """
+        if self.dirty or not self.complete:
+            return self.build(max_expansions, deadline)
+        return True
+
+    def distance(self, position, max_expansions = None, deadline = None):
+        """
+        Args:
+            position ( tuple ): row, col to start from
+            max_expansions ( int ): most cells the search may expand if the field isn't up to date, None for no limit
+            deadline ( float ): time.perf_counter() the search has to stop at, None for no limit
+
+        Returns:
+            float: cost of the cheapest path from `position` to the target, inf if it can't be reached,
+                   None if the field isn't done within the budget
+        """
+        if not self.update(max_expansions, deadline):
+            return None
+        return self.dist[position[0]*self.cols + position[1]]
+
+    def next_step(self, position):
+        """
+        The field has to be up to date (see update).
+
+        Returns:
+            tuple: the cell to step on from `position` towards the target, None if there is none
+        """
+        distance = self.dist[position[0]*self.cols + position[1]]
+        if position == self.target or distance == math.inf:
+            return None
+        if distance == 1 and STEP_EXTRA_COST[self.cells[self.target[0]*self.cols + self.target[1]]] is None:
+            return None  # next to a target that can't be stepped on
+        best, best_key = None, None
+        for x, y in [(position[0]+1, position[1]), (position[0]-1, position[1]), (position[0], position[1]+1), (position[0], position[1]-1)]:
+            if not (0 <= x < self.rows and 0 <= y < self.cols):
+                continue
+            extra = STEP_EXTRA_COST[self.cells[x*self.cols + y]]
+            if extra is None:
+                continue
+            # equal costs are broken towards the straight line to the target, like A* with its euclidean heuristic
+            key = (1 + extra + self.dist[x*self.cols + y], math.dist((x, y), self.target))
+            if best_key is None or key < best_key:
+                best, best_key = (x, y), key
+        return best
+
+
+class DistanceFields:
+    """
+    Distance fields of a team, one per target the agents keep going back to (flags, corners, regroup spot),
+    shared by all agents of the team. Registered with the knowledge base so the fields hear about every
+    changed cell.
+
+    Args:
+        grid ( list of lists ): pathfinding world of the team
+        size ( int ): number of targets to keep fields for
+    """
+
+    def __init__(self, grid, size = 8):
+        self.grid = grid
+        self.size = size
+        self.fields = OrderedDict()  # target -> DistanceField
+
+    def cell_changed(self, cell):
+        for field in self.fields.values():
+            field.cell_changed(cell)
+
+    def field(self, target):
+        """
+        Returns:
+            DistanceField: field of `target`, None if the target is outside of the grid
+        """
+        if not (0 <= target[0] < len(self.grid) and 0 <= target[1] < len(self.grid[0])):
+            return None
+        field = self.fields.get(target)
+        if field is None:
+            field = DistanceField(target, self.grid)
+            self.fields[target] = field
+            if len(self.fields) > self.size:
+                self.fields.popitem(last=False)
+        self.fields.move_to_end(target)
+        return field
+
+    def distance(self, position, target, max_expansions = None, deadline = None):
+        field = self.field(target)
+        return field.distance(position, max_expansions, deadline) if field else math.inf
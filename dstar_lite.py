@@ -0,0 +1,147 @@
+import heapq
+import math
+import time
+import pathfinding_stats
+
+
+# D* Lite (Koenig & Likhachev) on a 4-connected grid, searching backwards from the goal.
+#   Costs can change and the start can move between calls, only the part of the search those
+#   changes affect is redone instead of planning from scratch.
+class DStarLite:
+    """
+    Args:
+        start ( tuple ): row, col of the agent
+        goal ( tuple ): row, col of the target
+        rows, cols ( int ): size of the grid
+        step_cost ( callable ): cost of stepping onto a cell, None if the cell can't be entered
+    """
+
+    def __init__(self, start, goal, rows, cols, step_cost):
+        self.start = start
+        self.goal = goal
+        self.rows = rows
+        self.cols = cols
+        self.step_cost = step_cost
+        self.km = 0
+        self.last_start = start
+        self.g = {}
+        self.rhs = {goal: 0}
+        self.open_set = []
+        self.queued = {}  # cell -> key it is queued with (older heap entries are ignored)
+        self.expanded = 0
+        self.pushes = 0
+        self.reported_pushes = 0  # pushes already counted for an earlier call (see pathfinding_stats)
+        self._push(goal)
+
+    def neighbors(self, cell):
+        x, y = cell
+        return [(nx, ny) for nx, ny in [(x+1, y), (x-1, y), (x, y+1), (x, y-1)] if 0 <= nx < self.rows and 0 <= ny < self.cols]
+
+    def heuristic(self, a, b):
+        # every step costs at least 1, so the manhattan distance never overestimates
+        return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+    def cost(self, cell):
+        cost = self.step_cost(cell)
+        return math.inf if cost is None else cost
+
+    def key(self, cell):
+        best = min(self.g.get(cell, math.inf), self.rhs.get(cell, math.inf))
+        return (best + self.heuristic(self.start, cell) + self.km, best)
+
+    def _push(self, cell):
+        key = self.key(cell)
+        self.queued[cell] = key
+        heapq.heappush(self.open_set, (key, cell))
+        self.pushes += 1
+
+    def _top(self):
+        while self.open_set:
+            key, cell = self.open_set[0]
+            if self.queued.get(cell) == key:
+                return key, cell
+            heapq.heappop(self.open_set)
+        return None
+
+    def update_vertex(self, cell):
+        if cell != self.goal:
+            self.rhs[cell] = min((self.cost(neighbor) + self.g.get(neighbor, math.inf) for neighbor in self.neighbors(cell)), default=math.inf)
+        self.queued.pop(cell, None)
+        if self.g.get(cell, math.inf) != self.rhs.get(cell, math.inf):
+            self._push(cell)
+
+    def cells_changed(self, cells):
+        """
+        The cost of stepping onto `cells` changed: every edge leading into them changed.
+        """
+        for cell in cells:
+            for neighbor in self.neighbors(cell):
+                self.update_vertex(neighbor)
+
+    def move_start(self, start):
+        if start != self.start:
+            self.km += self.heuristic(self.last_start, start)
+            self.last_start = start
+            self.start = start
+
+    def compute(self, max_expansions = None, deadline = None):
+        """
+        Repairs the search until the start's cost is known.
+
+        Args:
+            max_expansions ( int ): most cells to expand, None for no limit
+            deadline ( float ): time.perf_counter() to stop at, None for no limit
+
+        Returns:
+            bool: False if it ran out of expansions or time (call again to continue)
+        """
+        expansions = 0
+        while True:
+            top = self._top()
+            start_g = self.g.get(self.start, math.inf)
+            start_rhs = self.rhs.get(self.start, math.inf)
+            if top is None or (top[0] >= self.key(self.start) and start_rhs == start_g):
+                self._report(expansions)
+                return True
+            if max_expansions is not None and expansions >= max_expansions \
+            or deadline is not None and expansions % 64 == 0 and time.perf_counter() > deadline:
+                self._report(expansions)
+                return False
+            expansions += 1
+            self.expanded += 1
+
+            old_key, cell = top
+            new_key = self.key(cell)
+            g = self.g.get(cell, math.inf)
+            rhs = self.rhs.get(cell, math.inf)
+            if old_key < new_key:
+                self._push(cell)
+            elif g > rhs:
+                self.g[cell] = rhs
+                del self.queued[cell]
+                for neighbor in self.neighbors(cell):
+                    self.update_vertex(neighbor)
+            else:
+                self.g[cell] = math.inf
+                for neighbor in self.neighbors(cell) + [cell]:
+                    self.update_vertex(neighbor)
+
+    def _report(self, expansions):
+        pathfinding_stats.searched(expansions, self.pushes - self.reported_pushes)
+        self.reported_pushes = self.pushes
+
+    def path(self):
+        """
+        Path from the start to the goal following the repaired costs, [] if the goal can't be reached.
+        """
+        if self.start == self.goal or self.g.get(self.start, math.inf) == math.inf:
+            return []
+        path = [self.start]
+        cell = self.start
+        while cell != self.goal and len(path) <= self.rows * self.cols:
+            # equal costs are broken towards the straight line to the goal, like A* with its euclidean heuristic
+            cell = min(self.neighbors(cell), key=lambda neighbor: (self.cost(neighbor) + self.g.get(neighbor, math.inf), math.dist(neighbor, self.goal)))
+            if self.g.get(cell, math.inf) == math.inf and cell != self.goal:
+                return []
+            path.append(cell)
+        return path if cell == self.goal else []
@@ -0,0 +1,91 @@
+import math
+from collections import OrderedDict
+
+
+class EnemyTracker:
+    """
+    Where a team has seen enemies lately: the last frame an enemy was seen on each cell. Sightings older than
+    `memory` frames are forgotten, and when more than `capacity` cells are tracked the oldest sighting goes,
+    so the store stays the same size however long the game runs. Cells are also kept in square buckets of
+    `bucket_size`, so the threats around a position are found without looking at every sighting.
+
+    Args:
+        memory ( int ): frames a sighting is remembered
+        capacity ( int ): most cells tracked at once
+        bucket_size ( int ): side of the buckets used by `within`
+    """
+
+    def __init__(self, memory = 150, capacity = 256, bucket_size = 8):
+        self.memory = memory
+        self.capacity = capacity
+        self.bucket_size = bucket_size
+        self.last_seen = OrderedDict()  # (row, col) -> frame, oldest sighting first
+        self.buckets = {}               # (row // bucket_size, col // bucket_size) -> set of tracked cells
+        self.version = 0                # changes whenever a cell starts or stops being tracked
+
+    def _bucket(self, cell):
+        return (cell[0] // self.bucket_size, cell[1] // self.bucket_size)
+
+    def _forget(self, cell):
+        del self.last_seen[cell]
+        bucket = self._bucket(cell)
+        self.buckets[bucket].discard(cell)
+        if not self.buckets[bucket]:
+            del self.buckets[bucket]
+        self.version += 1
+
+    def sighted(self, cell, frame):
+        """
+        An enemy is on `cell` in `frame`
+        """
+        if cell in self.last_seen:
+            self.last_seen.move_to_end(cell)
+        else:
+            self.buckets.setdefault(self._bucket(cell), set()).add(cell)
+            self.version += 1
+            if len(self.last_seen) >= self.capacity:
+                self._forget(next(iter(self.last_seen)))
+        self.last_seen[cell] = frame
+
+    def expire(self, frame):
+        """
+        Forgets the sightings older than `memory` frames at `frame`
+        """
+        while self.last_seen:
+            cell, seen = next(iter(self.last_seen.items()))
+            if frame - seen <= self.memory:
+                break
+            self._forget(cell)
+
+    def within(self, position, radius, frame = None, max_age = None):
+        """
+        Recent threats around a position
+
+        Args:
+            position ( tuple of ints ): row and column to look around
+            radius ( float ): largest (euclidean) distance from `position`
+            frame ( int ): current frame, needed with max_age
+            max_age ( int ): only sightings at most this many frames old, None for all remembered ones
+
+        Returns:
+            list: (row, col) of the sightings, nearest first
+        """
+        reach = int(radius) // self.bucket_size + 1
+        bucket_row, bucket_col = self._bucket(position)
+        found = []
+        for row in range(bucket_row - reach, bucket_row + reach + 1):
+            for col in range(bucket_col - reach, bucket_col + reach + 1):
+                for cell in self.buckets.get((row, col), ()):
+                    if math.dist(cell, position) <= radius and (max_age is None or frame - self.last_seen[cell] <= max_age):
+                        found.append(cell)
+        found.sort(key=lambda cell: (math.dist(cell, position), cell))
+        return found
+
+    def cells(self):
+        return self.last_seen.keys()
+
+    def __len__(self):
+        return len(self.last_seen)
+
+    def __contains__(self, cell):
+        return cell in self.last_seen
@@ -0,0 +1,71 @@
+"""
+Plays many seeded games in parallel, one game per worker process at a time.
+Every game starts with fresh team knowledge, frame counters and agent indices (see
+`tournament.reset_match_state`), so a worker can play any number of games one after another.
+
+Usage:
+    python farm.py --matches 100 --workers 8 --max-ticks 20000 --json results.json
+"""
+
+from headless import run_match
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import json
+import os
+import time
+
+
+def play(seed, max_ticks):
+    return run_match(seed=seed, max_ticks=max_ticks)
+
+
+def run_tournament(seeds, workers = None, max_ticks = None):
+    """
+    Spreads the games over a process pool and yields their results as soon as they finish
+    (not in the order of `seeds`).
+
+    Args:
+        seeds ( list of ints ): one game per seed
+        workers ( int ): number of worker processes, defaults to the number of cores
+        max_ticks ( int ): stop games that run longer than this (winner "timeout")
+
+    Yields:
+        MatchResult
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play, seed, max_ticks) for seed in seeds]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many games in parallel.")
+    parser.add_argument("--matches", type=int, default=os.cpu_count())
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-ticks", type=int, default=None)
+    parser.add_argument("--json", default=None, help="write all results to this file")
+    args = parser.parse_args()
+
+    seeds = range(args.first_seed, args.first_seed + args.matches)
+    wins = {}
+    results = []
+    start = time.perf_counter()
+    for result in run_tournament(seeds, args.workers, args.max_ticks):
+        results.append(result.to_dict())
+        wins[result.winner] = wins.get(result.winner, 0) + 1
+        print(f"seed {result.seed}: {result.winner} in {result.ticks} ticks")
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{len(results)} games in {elapsed:.1f}s ({len(results) / elapsed:.2f} games/s)")
+    for winner, count in sorted(wins.items()):
+        print(f"  {winner}: {count}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+NumPy backend for the world grid. Tiles are stored as uint8 codes (config.TILE_CODES) instead of
+lists of characters, so the buffer overlay, the 9x9 vision window and the wall checks are array
+operations. `CharView` hands the same data to code that still expects a matrix of characters.
+
+Only used when the world is created with `World(..., grid_backend="numpy")`, numpy is optional otherwise.
+"""
+
+from config import *
+from vision import VISION_RADIUS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EMPTY = TILE_CODES[ASCII_TILES["empty"]]
+WALL = TILE_CODES[ASCII_TILES["wall"]]
+UNKNOWN = TILE_CODES[ASCII_TILES["unknown"]]
+
+
+class CharRow:
+
+    def __init__(self, codes):
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, x):
+        return CODE_TILES[self.codes[x]]
+
+    def __iter__(self):
+        return iter(NumpyGrid.tiles[self.codes].tolist())
+
+
+class CharView:
+    """
+    Read-only char-matrix view of a code array: `view[y][x]` is a character from ASCII_TILES.
+    """
+
+    def __init__(self, codes):
+        self.codes = codes
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def __getitem__(self, y):
+        return CharRow(self.codes[y])
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self):
+        return NumpyGrid.tiles[self.codes].tolist()
+
+
+class NumpyGrid:
+
+    tiles = np.array(CODE_TILES) if np is not None else None
+
+    def __init__(self, worldmap):
+        if np is None:
+            raise ImportError("the numpy grid backend needs numpy (pip install numpy)")
+        self.height = len(worldmap)
+        self.width = len(worldmap[0])
+        self.static = np.array([[TILE_CODES[tile] for tile in row] for row in worldmap], dtype=np.uint8)
+        self.walls = self.static == WALL
+
+        # the buffer is surrounded by VISION_RADIUS unknown tiles, so the vision window is always a plain slice
+        r = VISION_RADIUS
+        self.padded = np.full((self.height + 2*r, self.width + 2*r), UNKNOWN, dtype=np.uint8)
+        self.buffer = self.padded[r:r + self.height, r:r + self.width]
+        self.buffer[:] = self.static
+        self.view = CharView(self.buffer)
+
+    def overlay(self, restore, draw):
+        """
+        Updates the buffer for `World.buffer_worldmap`.
+
+        Args:
+            restore ( list ): x, y of tiles that get their static tile back
+            draw ( dict ): (x, y) -> character of tiles with an object on them
+        """
+        if restore:
+            xs, ys = zip(*restore)
+            self.buffer[ys, xs] = self.static[ys, xs]
+        if draw:
+            xs, ys = zip(*draw)
+            self.buffer[ys, xs] = [TILE_CODES[tile] for tile in draw.values()]
+
+    def is_wall(self, x, y):
+        return self.walls[y, x]
+
+    def walls_ahead(self, bullets):
+        """
+        For every bullet, whether the tile it moves to next is a wall.
+        """
+        if not bullets:
+            return []
+        xs, ys = zip(*[(bullet.position[0] + bullet.direction[0], bullet.position[1] + bullet.direction[1]) for bullet in bullets])
+        return self.walls[ys, xs].tolist()
+
+    def window(self, position):
+        """
+        Tile codes in the (2*VISION_RADIUS+1)^2 square around `position`, unknown outside the map.
+        """
+        x, y = position
+        return self.padded[y:y + 2*VISION_RADIUS + 1, x:x + 2*VISION_RADIUS + 1]
+
+    def visible_world(self, position, hidden):
+        """
+        Vision of an agent as a matrix of characters (what the agents get).
+
+        Args:
+            position ( tuple ): x, y of the agent
+            hidden ( numpy array of bools ): tiles of the window hidden behind walls (see vision.VisionCache)
+        """
+        window = self.window(position)
+        return self.tiles[np.where(hidden, UNKNOWN, window)].tolist()
+
+    def occupied(self):
+        """
+        Yields x, y and tile of every tile that isn't empty (for the renderer).
+        """
+        ys, xs = np.nonzero(self.buffer != EMPTY)
+        codes = self.buffer[ys, xs]
+        for x, y, code in zip(xs.tolist(), ys.tolist(), codes.tolist()):
+            yield x, y, CODE_TILES[code]
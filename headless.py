@@ -0,0 +1,145 @@
+"""
+Runs a game without pygame. Drives `World` the same way `main.py` does, but with a pluggable clock
+(see clock.py) and returns a `MatchResult` instead of drawing the game.
+
+Usage:
+    python headless.py --seed 42 --max-ticks 20000
+    python headless.py --seed 42 --pathfinding-stats stats.json   # where the agents spend their planning time
+    python headless.py --seed 42 --knowledge-feed feed.jsonl      # what the teams learn every tick, see knowledge_feed.py
+"""
+
+from tournament import World
+from clock import FastClock
+from replay import ReplayRecorder
+import pathfinding_stats
+from config import *
+import blue_agent
+import red_agent
+
+import argparse
+import contextlib
+import io
+import json
+import random
+
+
+class MatchResult:
+
+    def __init__(self, seed, winner, ticks, survivors, flag_events):
+        self.seed = seed
+        self.winner = winner            # "blue", "red", "tied" or "timeout"
+        self.ticks = ticks
+        self.survivors = survivors      # list of (color, index, position)
+        self.flag_events = flag_events  # list of dicts, see World.add_flag_event
+
+    def to_dict(self):
+        return {
+            "seed": self.seed,
+            "winner": self.winner,
+            "ticks": self.ticks,
+            "survivors": [list(survivor) for survivor in self.survivors],
+            "flag_events": self.flag_events,
+        }
+
+    def __repr__(self):
+        return f"MatchResult(seed={self.seed}, winner={self.winner!r}, ticks={self.ticks}, survivors={len(self.survivors)})"
+
+
+def step(world):
+    """
+    One tick of the game loop from `main.main`, without rendering.
+    """
+    world.check_win_state()
+    world.buffer_worldmap()
+    if world.tick % 5 == 0:
+        world.update_agents()
+    else:
+        world.update_bullets()
+    world.iter()
+
+
+def run_match(seed = None, clock = None, max_ticks = None, quiet = True, on_tick = None, recorder = None, grid_backend = "list", on_changes = None):
+    """
+    Plays one game from start to finish.
+
+    Args:
+        seed ( int ): seed for `random`, the same seed generates the same world and the same game
+        clock ( object ): clock from clock.py, defaults to FastClock (as fast as possible)
+        max_ticks ( int ): stop the game after this many ticks, the winner is then "timeout"
+        quiet ( bool ): swallow everything the agents print
+        on_tick ( callable ): called with the world after every tick (for rendering, statistics, ...)
+        recorder ( ReplayRecorder ): records the game, see replay.py
+        grid_backend ( str ): "list" or "numpy", see grid.py
+        on_changes ( callable ): called with the team ("red" / "blue") and its ChangeSet once per tick, after all
+                                 agents acted, if the team learned something that tick, see knowledge_feed.py
+
+    Returns:
+        MatchResult
+    """
+    if seed is not None:
+        random.seed(seed)
+    world = World(HEIGHT, WIDTH, TICK_RATE, clock if clock else FastClock(), grid_backend)
+
+    output = io.StringIO() if quiet else None
+    with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+        world.generate_world()
+        if on_changes:
+            # generate_world gave both teams a new knowledge base
+            red_agent.knowlage_base.subscribe(lambda changes: on_changes("red", changes))
+            blue_agent.knowlage_base.subscribe(lambda changes: on_changes("blue", changes))
+        if recorder:
+            recorder.start(world)
+        while not world.win:
+            if max_ticks is not None and world.tick >= max_ticks:
+                break
+            step(world)
+            if recorder:
+                recorder.record(world)
+            if on_tick:
+                on_tick(world)
+            if quiet:
+                # agents print every frame, don't let the buffer grow for the whole game
+                output.seek(0)
+                output.truncate()
+        world.terminate_agents()
+    if recorder:
+        recorder.finish(world)
+
+    winner = world.win if world.win else "timeout"
+    survivors = [(agent.color, agent.index, agent.position) for agent in world.agents]
+    return MatchResult(seed, winner, world.tick, survivors, world.flag_events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a game without a window.")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--max-ticks", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true", help="show what the agents print")
+    parser.add_argument("--record", default=None, help="save a replay of the game to this file")
+    parser.add_argument("--grid", default="list", choices=["list", "numpy"], help="grid backend of the world")
+    parser.add_argument("--pathfinding-stats", default=None, help="record the agents' pathfinding and save the histograms to this file")
+    parser.add_argument("--knowledge-feed", default=None, help="write what the teams learn every tick to this file, one json line per change set")
+    args = parser.parse_args()
+
+    recorder = ReplayRecorder() if args.record else None
+    stats = pathfinding_stats.enable() if args.pathfinding_stats else None
+    feed = open(args.knowledge_feed, "w") if args.knowledge_feed else None
+
+    def write_changes(team, changes):
+        feed.write(json.dumps(dict(team=team, **changes.to_dict())) + "\n")
+
+    result = run_match(seed=args.seed, max_ticks=args.max_ticks, quiet=not args.verbose, recorder=recorder, grid_backend=args.grid,
+                       on_changes=write_changes if feed else None)
+    pathfinding_stats.disable()
+    if feed:
+        feed.close()
+    if recorder:
+        recorder.save(args.record)
+    if stats:
+        stats.dump(args.pathfinding_stats)
+        print(stats.report())
+    print(result.to_dict())
+
+
+if __name__ == "__main__":
+    main()
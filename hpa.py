@@ -0,0 +1,309 @@
+import heapq
+import math
+import time
+import pathfinding_stats
+from pathfinding_agent import STEP_EXTRA_COST, SearchBudget
+
+CLUSTER_SIZE = 16     # cells along each side of a cluster
+LONG_ENTRANCE = 6     # entrances at least this wide also get a transition at both ends
+
+
+# Hierarchical pathfinding (HPA*, Botea, Müller & Schaeffer) over pathfinding_world.
+#   The grid is cut into square clusters. Where two clusters touch, every run of cells open on both sides
+#   of the border is an entrance with one to three transitions (pairs of cells facing each other). The cells
+#   of the transitions are the nodes of an abstract graph: neighbouring clusters are joined across the border,
+#   and the nodes of one cluster are joined by the cost of the cheapest path between them inside the cluster.
+class ClusterGraph:
+    """
+    Abstract graph of a pathfinding world, for maps too big to search cell by cell on every decision.
+    Registered with the knowledge base: a changed cell marks its cluster (and the border it lies on) dirty,
+    and only dirty clusters are rebuilt on the next query (as many as the query's budget allows).
+
+    Args:
+        grid ( list of lists ): pathfinding world
+        cluster_size ( int ): cells along each side of a cluster
+    """
+
+    def __init__(self, grid, cluster_size = CLUSTER_SIZE):
+        self.grid = grid
+        self.rows = len(grid)
+        self.cols = len(grid[0])
+        self.size = cluster_size
+        self.cluster_rows = -(-self.rows // cluster_size)
+        self.cluster_cols = -(-self.cols // cluster_size)
+        self.transitions = {}  # border -> list of (cell, cell) facing each other across it
+        self.nodes = {}        # cluster -> set of transition cells inside it
+        self.intra = {}        # cluster -> {node: {node: cost}} paths inside the cluster
+        self.inter = {}        # node -> {node: cost} steps across a border
+        self.dirty_borders = set(self.borders())
+        self.dirty_clusters = {(row, col) for row in range(self.cluster_rows) for col in range(self.cluster_cols)}
+        self.rebuilt = 0
+
+    def borders(self):
+        # a border is named by the cluster above / left of it and the side: "down" or "right"
+        for row in range(self.cluster_rows):
+            for col in range(self.cluster_cols):
+                if row + 1 < self.cluster_rows:
+                    yield (row, col, "down")
+                if col + 1 < self.cluster_cols:
+                    yield (row, col, "right")
+
+    def cluster(self, cell):
+        return (cell[0] // self.size, cell[1] // self.size)
+
+    def bounds(self, cluster):
+        # first and one past the last row and column of the cluster
+        return (cluster[0] * self.size, min((cluster[0] + 1) * self.size, self.rows),
+                cluster[1] * self.size, min((cluster[1] + 1) * self.size, self.cols))
+
+    def step_cost(self, cell):
+        extra = STEP_EXTRA_COST[self.grid[cell[0]][cell[1]]]
+        return None if extra is None else 1 + extra
+
+    def cell_changed(self, cell):
+        row, col = cell
+        cluster = self.cluster(cell)
+        self.dirty_clusters.add(cluster)
+        if row % self.size == 0 and row > 0:
+            self.dirty_borders.add((cluster[0] - 1, cluster[1], "down"))
+        if row % self.size == self.size - 1 and row + 1 < self.rows:
+            self.dirty_borders.add((cluster[0], cluster[1], "down"))
+        if col % self.size == 0 and col > 0:
+            self.dirty_borders.add((cluster[0], cluster[1] - 1, "right"))
+        if col % self.size == self.size - 1 and col + 1 < self.cols:
+            self.dirty_borders.add((cluster[0], cluster[1], "right"))
+
+    def _border_cells(self, border):
+        # pairs of cells facing each other across the border, in order along it
+        row, col, side = border
+        top, bottom, left, right = self.bounds((row, col))
+        if side == "down":
+            return [((bottom - 1, y), (bottom, y)) for y in range(left, right)]
+        return [((x, right - 1), (x, right)) for x in range(top, bottom)]
+
+    def _build_border(self, border):
+        for a, b in self.transitions.get(border, []):
+            self._unlink(a, b)
+            self._unlink(b, a)
+        transitions = []
+        run = []
+        for a, b in self._border_cells(border) + [(None, None)]:
+            if a is not None and self.step_cost(a) is not None and self.step_cost(b) is not None:
+                run.append((a, b))
+                continue
+            if run:
+                # the cheapest pair to cross at, the middle one of equal ones; wide entrances also get both ends
+                middle = (len(run) - 1) / 2
+                best = min(range(len(run)), key=lambda i: (self.step_cost(run[i][0]) + self.step_cost(run[i][1]), abs(i - middle)))
+                picked = {0, best, len(run) - 1} if len(run) >= LONG_ENTRANCE else {best}
+                transitions += [run[i] for i in sorted(picked)]
+            run = []
+        for a, b in transitions:
+            self.inter.setdefault(a, {})[b] = self.step_cost(b)
+            self.inter.setdefault(b, {})[a] = self.step_cost(a)
+        self.transitions[border] = transitions
+        row, col, side = border
+        self.dirty_clusters.add((row, col))
+        self.dirty_clusters.add((row + 1, col) if side == "down" else (row, col + 1))
+
+    def _unlink(self, a, b):
+        partners = self.inter.get(a)
+        if partners is not None:
+            partners.pop(b, None)
+            if not partners:
+                del self.inter[a]
+
+    def _cluster_nodes(self, cluster):
+        row, col = cluster
+        nodes = set()
+        for border, side in [((row, col, "down"), 0), ((row, col, "right"), 0), ((row - 1, col, "down"), 1), ((row, col - 1, "right"), 1)]:
+            for pair in self.transitions.get(border, []):
+                nodes.add(pair[side])
+        return nodes
+
+    def _build_cluster(self, cluster):
+        nodes = self._cluster_nodes(cluster)
+        self.nodes[cluster] = nodes
+        top, bottom, left, right = self.bounds(cluster)
+        values = {self.grid[x][y] for x in range(top, bottom) for y in range(left, right)}
+        edges = {}
+        if len(values) == 1 and STEP_EXTRA_COST[next(iter(values))] is not None:
+            # every cell costs the same (nobody has seen it yet, or it's all floor): any shortest path is a manhattan one
+            step = 1 + STEP_EXTRA_COST[next(iter(values))]
+            for node in nodes:
+                edges[node] = {other: step * (abs(node[0] - other[0]) + abs(node[1] - other[1])) for other in nodes if other != node}
+        else:
+            for node in nodes:
+                dist, _ = self.search(node, cluster)
+                edges[node] = {other: dist[other] for other in nodes if other != node and other in dist}
+        self.intra[cluster] = edges
+        self.rebuilt += 1
+
+    def update(self, max_expansions = None, deadline = None):
+        """
+        Rebuilds the transitions of dirty borders and then the paths inside dirty clusters, the ones left when
+        the budget runs out stay dirty for the next call.
+
+        Args:
+            max_expansions ( int ): most cells the searches inside the clusters may expand, None for no limit
+            deadline ( float ): time.perf_counter() to stop at, None for no limit
+
+        Returns:
+            bool: True if the graph is up to date
+        """
+        budget = SearchBudget(max_expansions, deadline)
+        while self.dirty_borders:
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+            self._build_border(self.dirty_borders.pop())
+        while self.dirty_clusters:
+            if budget.expansions() == 0 or deadline is not None and time.perf_counter() > deadline:
+                return False
+            self._build_cluster(self.dirty_clusters.pop())
+        return True
+
+    def search(self, source, cluster, fear = None, reverse = False, max_expansions = None, deadline = None):
+        """
+        Dijkstra from `source` without leaving `cluster`.
+
+        Args:
+            source ( tuple ): row, col to search from
+            cluster ( tuple ): cluster to stay in
+            fear ( list ): fear of every cell (FearField.values) added to the cost of stepping on it, None for none
+            reverse ( bool ): cost of getting from every cell to `source` instead of from `source` to every cell
+            max_expansions ( int ): most cells to expand, None for no limit
+            deadline ( float ): time.perf_counter() to stop at, None for no limit
+
+        Returns:
+            dict, dict: cost of every cell reached, the cell each one was reached from. When the search runs out
+                        of budget the costs of the cells it didn't expand are those of some path, not the cheapest
+        """
+        top, bottom, left, right = self.bounds(cluster)
+        grid, cols = self.grid, self.cols
+        dist = {source: 0}
+        came_from = {}
+        open_set = [(0, source)]
+        expansions = pushes = 0
+        while open_set:
+            current_dist, current = heapq.heappop(open_set)
+            if current_dist > dist[current]:
+                continue
+            if max_expansions is not None and expansions >= max_expansions \
+            or deadline is not None and expansions % 64 == 0 and time.perf_counter() > deadline:
+                break
+            expansions += 1
+            x, y = current
+            if reverse:
+                # every neighbour gets here by stepping on `current`
+                extra = STEP_EXTRA_COST[grid[x][y]]
+                if extra is None:
+                    continue
+                step_dist = current_dist + 1 + extra
+            for neighbor in [(x+1, y), (x-1, y), (x, y+1), (x, y-1)]:
+                nx, ny = neighbor
+                if not (top <= nx < bottom and left <= ny < right):
+                    continue
+                extra = STEP_EXTRA_COST[grid[nx][ny]]
+                if extra is None:
+                    continue
+                if not reverse:
+                    step_dist = current_dist + 1 + extra
+                    if fear is not None:
+                        step_dist += fear[nx*cols + ny]
+                if step_dist < dist.get(neighbor, math.inf):
+                    dist[neighbor] = step_dist
+                    came_from[neighbor] = current
+                    heapq.heappush(open_set, (step_dist, neighbor))
+                    pushes += 1
+        pathfinding_stats.searched(expansions, pushes)
+        return dist, came_from
+
+    def path(self, start, goal, enemy_pos = None, max_expansions = None, deadline = None):
+        """
+        Path from `start` to `goal` through the abstract graph. Only the part inside the start's cluster is
+        refined into cells (with the fear of enemies), after it come the transitions the path goes through and
+        the goal, to be refined on later calls as the agent gets there.
+        The rebuild of dirty clusters, the searches inside the start's and the goal's cluster and the abstract
+        search share the budget. When the abstract search runs out, the path leads to the open node with the
+        lowest f instead of the goal.
+
+        Args:
+            start ( tuple ): row, col of the agent
+            goal ( tuple ): row, col of the target
+            enemy_pos ( FearField ): enemies to keep away from inside the start's cluster, None for none
+            max_expansions ( int ): most nodes to expand, None for no limit
+            deadline ( float ): time.perf_counter() to stop at, None for no limit
+
+        Returns:
+            list: cells of the first cluster then waypoints, [] if there is no path or the graph couldn't be
+                  brought up to date within the budget
+        """
+        if not (0 <= goal[0] < self.rows and 0 <= goal[1] < self.cols) or start == goal:
+            return []
+        budget = SearchBudget(max_expansions, deadline)
+        if not self.update(budget.expansions(), deadline):
+            return []
+        fear = getattr(enemy_pos, "values", None) if enemy_pos is not None and len(enemy_pos) > 0 else None
+        start_cluster, goal_cluster = self.cluster(start), self.cluster(goal)
+        start_dist, start_parent = self.search(start, start_cluster, fear, max_expansions=budget.expansions(), deadline=deadline)
+        goal_dist, _ = self.search(goal, goal_cluster, reverse=True, max_expansions=budget.expansions(), deadline=deadline)
+        out = {node: start_dist[node] for node in self.nodes[start_cluster] if node in start_dist and node != start}
+        if goal in start_dist:
+            out[goal] = start_dist[goal]
+        into = {node: goal_dist[node] for node in self.nodes[goal_cluster] if node in goal_dist}
+
+        def heuristic(cell):
+            return abs(cell[0] - goal[0]) + abs(cell[1] - goal[1])
+
+        g_cost = {start: 0}
+        came_from = {}
+        open_set = [(heuristic(start), start)]
+        max_expansions = budget.expansions()
+        expansions = pushes = 0
+        out_of_budget = False
+        while open_set:
+            _, current = heapq.heappop(open_set)
+            if current == goal:
+                break
+            if max_expansions is not None and expansions >= max_expansions \
+            or deadline is not None and expansions % 64 == 0 and time.perf_counter() > deadline:
+                out_of_budget = True
+                break
+            expansions += 1
+            current_cost = g_cost[current]
+            if current == start:
+                edges = [out, self.inter.get(start, {})]
+            else:
+                edges = [self.intra[self.cluster(current)].get(current, {}), self.inter.get(current, {})]
+                if current in into:
+                    edges.append({goal: into[current]})
+            for neighbors in edges:
+                for neighbor, cost in neighbors.items():
+                    tentative_g_cost = current_cost + cost
+                    if tentative_g_cost < g_cost.get(neighbor, math.inf):
+                        g_cost[neighbor] = tentative_g_cost
+                        came_from[neighbor] = current
+                        heapq.heappush(open_set, (tentative_g_cost + heuristic(neighbor), neighbor))
+                        pushes += 1
+        pathfinding_stats.searched(expansions, pushes)
+        if current != goal and not out_of_budget:
+            return []
+
+        # to the goal, or when out of budget to `current`, the open node with the lowest f
+        waypoints = [current]
+        while waypoints[-1] != start:
+            waypoints.append(came_from[waypoints[-1]])
+        waypoints.reverse()
+        if len(waypoints) < 2:
+            return []
+
+        # refine the first leg: inside the cluster from the start's search, or a single step across the border
+        first = waypoints[1]
+        if first in start_dist and start_dist[first] == g_cost[first]:
+            leg = [first]
+            while leg[-1] != start:
+                leg.append(start_parent[leg[-1]])
+            leg.reverse()
+        else:
+            leg = [start, first]
+        return leg + waypoints[2:]
@@ -1,10 +1,32 @@
 from config import *
+from pathfinding_agent import FearField
+from distance_field import DistanceFields
+from reachability import ReachabilityIndex
+from hpa import ClusterGraph
+from path_cache import PathCache
+from enemy_tracker import EnemyTracker
+from knowledge_feed import ChangeSet
 import math
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# merge visions with numpy (merge_vision_numpy) instead of the loop, in a game it isn't faster:
+#   the window is too small for numpy to make up for turning it into arrays (see benchmarks/merge_vision.py)
+MERGE_VISION_NUMPY = False
+
 class KnowlageBase:
     def __init__(self, friendly_flag, enemy_flag, enemy, friend):
         self.knowlage_base = [["/" for _ in range(WIDTH)] for _ in range(HEIGHT)]
-        self.pathfinding_world = [[-1 for _ in range(WIDTH)] for _ in range(HEIGHT)]
+        self.pathfinding_world = [[-1 for _ in range(WIDTH)] for _ in range(HEIGHT)]  # terrain with danger on top, see pathfinding_value
+        self.terrain = [[-1 for _ in range(WIDTH)] for _ in range(HEIGHT)]  # -1 unknown, 0 empty, 1 obstacle
+        self.danger = [[0 for _ in range(WIDTH)] for _ in range(HEIGHT)]    # number of marked enemies that can shoot at a cell
+        self.threats = set()  # positions of the enemies whose lines of fire are marked in danger
+        self.transients = {}  # (row, col) -> enemy or bullet tile the knowledge base shows there
+        self.terrain_table = None  # tile code -> terrain, see vision_tables
+        self.transient_table = None
         self.friendly_flag = friendly_flag
         self.enemy_flag = enemy_flag
         self.enemy = enemy
@@ -24,13 +46,131 @@ class KnowlageBase:
         self.agent2_at_position = False
         self.holding_flag = False
         self.flage_in_danger = False
-        self.dangerous_location = []
-        self.all_enemy_location = []
+        self.enemy_tracker = EnemyTracker(memory=150, capacity=256)  # cells enemies were seen on lately
+        self.frame = 0
+        self.current_fear_field = None
+        self.fear_field_version = None
         self.defend_cooldown = 200
         self.agent0_action = None
         self.agent1_action = None
         self.agent2_action = None
         self.regrup_radius = 10
+        self.path_caches = []
+        self.distance_fields = DistanceFields(self.pathfinding_world)
+        self.register_path_cache(self.distance_fields)
+        self.reachability = ReachabilityIndex(self.pathfinding_world)
+        self.register_path_cache(self.reachability)
+        self.hierarchy = ClusterGraph(self.pathfinding_world)
+        self.register_path_cache(self.hierarchy)
+        self.team_paths = PathCache(size=8)  # plans towards targets every agent goes to, one search per target
+        self.register_path_cache(self.team_paths)
+        self.changes = ChangeSet()  # what changed since the last publish_changes
+        self.subscribers = []
+
+    def register_path_cache(self, cache):
+        """
+        Registers a cache of plans to be told about every cell of pathfinding_world that changes, right when it
+        changes. Caches can't wait for the change set subscribe gets once per tick: an agent acting later in the
+        same tick would plan through a wall a teammate just saw.
+
+        Args:
+            cache ( PathCache / DistanceFields / ReachabilityIndex / ClusterGraph ): anything with a cell_changed((row, col)) method
+        """
+        self.path_caches.append(cache)
+
+    def set_pathfinding_cost(self, row, col, value):
+        """
+        Sets a cell of pathfinding_world, registered path caches are notified if the value changed
+
+        Args:
+            row ( int ): row index of the cell
+            col ( int ): column index of the cell
+            value ( int ): -1 unknown, 0 empty, 1 obstacle, 2 enemy
+        """
+        if self.pathfinding_world[row][col] != value:
+            self.changes.cost_changed((row, col), self.pathfinding_world[row][col], value)
+            self.pathfinding_world[row][col] = value
+            for cache in self.path_caches:
+                cache.cell_changed((row, col))
+
+    def subscribe(self, callback):
+        """
+        Registers a function to be called with the ChangeSet of every publish_changes that changed something
+
+        Args:
+            callback ( callable ): takes a knowledge_feed.ChangeSet
+        """
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def publish_changes(self, tick):
+        """
+        Hands what changed since the last publish (newly discovered tiles, pathfinding_world costs, flags found,
+        enemies seen) to the subscribers and starts a new change set. The team calls it once per tick, after every
+        one of its agents merged its vision (see the agent_tick_done hook in team_hooks.py).
+
+        Args:
+            tick ( int ): world tick the changes are stamped with
+
+        Returns:
+            ChangeSet: the published changes
+        """
+        changes = self.changes
+        changes.tick = tick
+        changes.compact()
+        self.changes = ChangeSet()
+        if changes:
+            for callback in list(self.subscribers):
+                callback(changes)
+        return changes
+
+    def pathfinding_value(self, row, col):
+        """
+        Value of a cell in pathfinding_world: its terrain, or 2 for an empty cell an enemy can shoot at.
+        Danger doesn't cover up obstacles, and unknown cells already cost more than dangerous ones.
+
+        Returns:
+            int: -1 unknown, 0 empty, 1 obstacle, 2 enemy
+        """
+        terrain = self.terrain[row][col]
+        if terrain == 0 and self.danger[row][col]:
+            return 2
+        return terrain
+
+    def set_terrain(self, row, col, value):
+        """
+        Sets what is known about a cell (danger is kept apart, see mark_threat)
+
+        Args:
+            row ( int ): row index of the cell
+            col ( int ): column index of the cell
+            value ( int ): -1 unknown, 0 empty, 1 obstacle
+        """
+        self.terrain[row][col] = value
+        self.set_pathfinding_cost(row, col, self.pathfinding_value(row, col))
+
+    def threat_lines(self, enemy):
+        """
+        Cells in the row and column of an enemy within shoot_distance, each once
+        """
+        enemy_row, enemy_col = enemy
+        cells = [(enemy_row, j) for j in range(max(0, enemy_col - self.shoot_distance), min(WIDTH, enemy_col + self.shoot_distance + 1))]
+        cells += [(i, enemy_col) for i in range(max(0, enemy_row - self.shoot_distance), min(HEIGHT, enemy_row + self.shoot_distance + 1)) if i != enemy_row]
+        return cells
+
+    def mark_threat(self, enemy, count = 1):
+        """
+        Adds (count 1) or removes (count -1) the danger of an enemy on its lines of fire
+
+        Args:
+            enemy ( tuple of ints ): row and column of the enemy
+            count ( int ): 1 to add, -1 to remove
+        """
+        for row, col in self.threat_lines(enemy):
+            self.danger[row][col] += count
+            self.set_pathfinding_cost(row, col, self.pathfinding_value(row, col))
 
     def update_agent_action(self, agent, action):
         """
@@ -105,66 +245,37 @@ class KnowlageBase:
         """
         If the flag is missing from the position, set it's original position as passable
         """
-        self.pathfinding_world[self.friendly_flag_location[0]][self.friendly_flag_location[1]] = 0
+        self.set_terrain(self.friendly_flag_location[0], self.friendly_flag_location[1], 0)
         print("return enabled")
 
     def refresh_enemys(self):
         """
-        Refreshes the positions of enemies that have moved since the last scan
-        """
-        enemys = []
-        for row in range(len(self.knowlage_base)):
-            for col in range(len(self.knowlage_base[row])):
-                if self.knowlage_base[row][col] in [self.enemy, '.']:
-                    self.knowlage_base[row][col] = ' '
-                    if self.knowlage_base[row][col] == self.enemy:
-                        enemys.append((row, col))
-
-        # clear dangerous_locations
-        for enemy in enemys:
-            enemy_row = enemy[0]
-            enemy_col = enemy[1]
-
-            # Check the same row within 4 columns of the agent
-            # dangerous rows
-            for j in range(max(0, enemy_col - self.shoot_distance), min(len(self.knowlage_base[0]), enemy_col + (self.shoot_distance + 1))):
-                self.dangerous_location.remove((enemy_row, j))
-                self.pathfinding_world[enemy_row][j] = 0
-                
-            # dangerous cols
-            for i in range(max(0, enemy_row - self.shoot_distance), min(len(self.knowlage_base), enemy_row + (self.shoot_distance + 1))):
-                self.dangerous_location.remove((i, enemy_col))
-                self.pathfinding_world[i][enemy_col] = 0
+        Refreshes the positions of enemies that have moved since the last scan: bullets are cleared from the
+        knowledge base and the danger of every marked enemy is removed, find_dangerous_location marks the
+        enemies around the agents again. Only the cells in transients are looked at, not the whole map
+        """
+        for (row, col), tile in list(self.transients.items()):
+            if tile in [self.enemy, '.']:
+                self.knowlage_base[row][col] = ' '
+                del self.transients[(row, col)]
+
+        for enemy in self.threats:
+            self.mark_threat(enemy, -1)
+        self.threats = set()
 
     def find_dangerous_location(self, agent_pos_row, agent_pos_col):
         """
-        Scans the knowledge base for enemies and marks them as dangerous locations for agent
-        to avoid and appends them in variable dangerous_locations and pathfinding_world
+        Looks up the enemies around the agent in transients and marks the cells they can shoot at
+        as dangerous for the pathfinding (see mark_threat), every enemy position once
 
         Args:
             agent_pos_row ( int ): row index of agent's position
             agent_pos_col ( int ): column index of agent's position
         """
-        enemys = []
-        for i in range(max(0, agent_pos_row - 4), min(len(self.knowlage_base), agent_pos_row + 5)):
-            for j in range(max(0, agent_pos_col - 4), min(len(self.knowlage_base[0]), agent_pos_col + 5)):
-                if self.knowlage_base[i][j] == self.enemy[0]:
-                    enemys.append((i, j))
-        
-        for enemy in enemys:
-            enemy_row = enemy[0]
-            enemy_col = enemy[1]
-
-            # Check the same row within 4 columns of the agent
-            # dangerous rows
-            for j in range(max(0, enemy_col - self.shoot_distance), min(len(self.knowlage_base[0]), enemy_col + (self.shoot_distance + 1))):
-                self.dangerous_location.append((enemy_row, j))
-                self.pathfinding_world[enemy_row][j] = 2
-                
-            # dangerous cols
-            for i in range(max(0, enemy_row - self.shoot_distance), min(len(self.knowlage_base), enemy_row + (self.shoot_distance + 1))):
-                self.dangerous_location.append((i, enemy_col))
-                self.pathfinding_world[i][enemy_col] = 2
+        for (i, j), tile in list(self.transients.items()):
+            if tile == self.enemy[0] and abs(i - agent_pos_row) <= 4 and abs(j - agent_pos_col) <= 4 and (i, j) not in self.threats:
+                self.threats.add((i, j))
+                self.mark_threat((i, j))
 
     def update_general_knowlage_base(self, visible_range, agent_pos_row, agent_pos_col, current_vision):
         """
@@ -177,6 +288,20 @@ class KnowlageBase:
             agent_pos_col ( int ): column index of agent's position
             current_vision ( list of lists / matrix ): the world as the agents sees it. 9x9 square around him
         """
+        self.frame += 1
+        flags = {"enemy_flag": self.enemy_flag_location, "friendly_flag": self.friendly_flag_location}
+        if MERGE_VISION_NUMPY and np is not None:
+            self.merge_vision_numpy(visible_range, agent_pos_row, agent_pos_col, current_vision)
+        else:
+            self.merge_vision(visible_range, agent_pos_row, agent_pos_col, current_vision)
+        for flag, location in [("enemy_flag", self.enemy_flag_location), ("friendly_flag", self.friendly_flag_location)]:
+            if location != flags[flag]:
+                self.changes.flags[flag] = location
+
+    def merge_vision(self, visible_range, agent_pos_row, agent_pos_col, current_vision):
+        """
+        update_general_knowlage_base cell by cell, without numpy
+        """
         for row_offset in range(-visible_range, visible_range+1):
             for col_offset in range(-visible_range, visible_range+1):
                 if 0 <= agent_pos_row + row_offset < HEIGHT\
@@ -184,25 +309,33 @@ class KnowlageBase:
                     row, col = agent_pos_row + row_offset, agent_pos_col + col_offset
                     current_vision_row, current_vision_col = row_offset + 4, col_offset + 4
                     if current_vision[current_vision_row][current_vision_col] != "/":
+                        if self.knowlage_base[row][col] == "/":
+                            self.changes.discovered.append((row, col))
                         self.knowlage_base[row][col] = current_vision[current_vision_row][current_vision_col]
-                        if current_vision[current_vision_row][current_vision_col] == self.enemy[0]:
-                            self.all_enemy_location.append((row, col))
+                        if current_vision[current_vision_row][current_vision_col] in self.enemy or current_vision[current_vision_row][current_vision_col] == '.':
+                            self.transients[(row, col)] = current_vision[current_vision_row][current_vision_col]
+                        else:
+                            self.transients.pop((row, col), None)
+                        if current_vision[current_vision_row][current_vision_col] in self.enemy:
+                            self.enemy_tracker.sighted((row, col), self.frame)
+                            self.changes.sightings.append((row, col))
 
                         #      -1 -> unknown (/)
                         #       0 -> empty space (" ")
                         #       1 -> obstacle (#)
                         #       2 -> enemy
                         if current_vision[current_vision_row][current_vision_col] in [" ", self.enemy[1], self.friend[0], self.friend[1], self.enemy_flag]:
-                            self.pathfinding_world[row][col] = 0
+                            self.set_terrain(row, col, 0)
                         elif current_vision[current_vision_row][current_vision_col] == "#":
-                            self.pathfinding_world[row][col] = 1
+                            self.set_terrain(row, col, 1)
                         elif current_vision[current_vision_row][current_vision_col] == self.friendly_flag:
                             if not self.holding_flag:
-                                self.pathfinding_world[row][col] = 1
+                                self.set_terrain(row, col, 1)
                             else:
-                                self.pathfinding_world[row][col] = 0
+                                self.set_terrain(row, col, 0)
                         elif current_vision[current_vision_row][current_vision_col] == self.enemy[0]:
-                            self.pathfinding_world[row][col] = 2
+                            # the enemy stands on an empty cell, find_dangerous_location marks it dangerous
+                            self.set_terrain(row, col, 0)
 
                         if current_vision[current_vision_row][current_vision_col] == self.enemy_flag:
                             self.enemy_flag_location = (row, col)
@@ -212,6 +345,145 @@ class KnowlageBase:
                            if self.pathfinding_world[row][col] == 0:
                                     self.reserve_regrup_spot = (row, col)
 
+    def merge_vision_numpy(self, visible_range, agent_pos_row, agent_pos_col, current_vision):
+        """
+        update_general_knowlage_base with numpy (with MERGE_VISION_NUMPY set): the vision window is turned into tile codes once (the code
+        point of every character), looked up in tables of what each tile means and applied through masks.
+        Only the cells that change are written back one by one, in the same order as the loop, so path caches
+        are told the same. Leaves the knowledge base as the loop does.
+
+        Args:
+            visible_range ( int ): number of tiles visible in each direction
+            agent_pos_row ( int ): row index of agent's position
+            agent_pos_col ( int ): column index of agent's position
+            current_vision ( list of lists / matrix ): the world as the agents sees it. 9x9 square around him
+        """
+        top, bottom = max(0, agent_pos_row - visible_range), min(HEIGHT, agent_pos_row + visible_range + 1)
+        left, right = max(0, agent_pos_col - visible_range), min(WIDTH, agent_pos_col + visible_range + 1)
+        if top >= bottom or left >= right:
+            return
+        vision = np.array(current_vision, dtype="<U1")[top - agent_pos_row + 4:bottom - agent_pos_row + 4, left - agent_pos_col + 4:right - agent_pos_col + 4]
+        codes = vision.view(np.uint32)
+        seen = codes != ord("/")
+        if not seen.any():
+            return
+        terrain_table, transient_table = self.vision_tables(int(codes.max()) + 1)
+        terrain = terrain_table[codes]  # -2 where the loop leaves the terrain alone (bullets, hidden tiles)
+        transient = transient_table[codes]
+
+        tiles = vision.tolist()
+        unknown = np.array([row[left:right] for row in self.knowlage_base[top:bottom]], dtype="<U1") == "/"
+        rows, cols = np.nonzero(seen & unknown)
+        self.changes.discovered += [(top + i, left + j) for i, j in zip(rows.tolist(), cols.tolist())]
+        for row, whole in zip(range(top, bottom), seen.all(axis=1).tolist()):
+            if whole:
+                self.knowlage_base[row][left:right] = tiles[row - top]
+            else:
+                knowlage_row = self.knowlage_base[row]
+                for col, tile in enumerate(tiles[row - top], left):
+                    if tile != "/":
+                        knowlage_row[col] = tile
+
+        for (row, col) in list(self.transients):
+            if top <= row < bottom and left <= col < right and seen[row - top, col - left] and not transient[row - top, col - left]:
+                del self.transients[(row, col)]
+        for i, j in zip(*np.nonzero(transient)):
+            cell, tile = (top + int(i), left + int(j)), tiles[i][j]
+            self.transients[cell] = tile
+            if tile in self.enemy:
+                self.enemy_tracker.sighted(cell, self.frame)
+                self.changes.sightings.append(cell)
+
+        known = np.array([row[left:right] for row in self.terrain[top:bottom]], dtype=np.int8)
+        rows, cols = np.nonzero((terrain != -2) & (terrain != known))
+        for i, j, value in zip(rows.tolist(), cols.tolist(), terrain[rows, cols].tolist()):
+            self.set_terrain(top + i, left + j, value)
+
+        for tile, attribute in [(self.enemy_flag, "enemy_flag_location"), (self.friendly_flag, "friendly_flag_location")]:
+            rows, cols = np.nonzero(codes == ord(tile))
+            if len(rows):
+                setattr(self, attribute, (top + int(rows[-1]), left + int(cols[-1])))
+
+        if self.regrup_spot == None and HEIGHT/2 - 8 < bottom - 1 and top < HEIGHT/2 + 8 and WIDTH/2 - 8 < right - 1 and left < WIDTH/2 + 8:
+            rows = np.arange(top, bottom)[:, None]
+            cols = np.arange(left, right)[None, :]
+            zone = ((HEIGHT/2 - 8) < rows) & (rows < (HEIGHT/2 + 8)) & ((WIDTH/2 - 8) < cols) & (cols < (WIDTH/2 + 8))
+            empty = np.array([row[left:right] for row in self.pathfinding_world[top:bottom]]) == 0
+            rows, cols = np.nonzero(seen & zone & empty)
+            if len(rows):
+                self.reserve_regrup_spot = (top + int(rows[-1]), left + int(cols[-1]))
+
+    def vision_tables(self, size = 128):
+        """
+        Lookup tables indexed by the code point of a tile: its terrain (-2 for tiles that don't change the
+        terrain) and whether it is an enemy or a bullet (see transients)
+
+        Args:
+            size ( int ): one past the highest code point to be looked up, the tables grow to fit it
+
+        Returns:
+            numpy.ndarray, numpy.ndarray: the terrain and the transient table
+        """
+        if self.terrain_table is None or len(self.terrain_table) < size:
+            tiles = [" ", "#", ".", self.friend[0], self.friend[1], self.enemy_flag, self.friendly_flag] + list(self.enemy)
+            size = max(size, max(ord(tile) for tile in tiles) + 1)
+            self.terrain_table = np.full(size, -2, dtype=np.int8)
+            for tile in [" ", self.enemy[1], self.friend[0], self.friend[1], self.enemy_flag, self.enemy[0]]:
+                self.terrain_table[ord(tile)] = 0
+            self.terrain_table[ord("#")] = 1
+            self.transient_table = np.zeros(size, dtype=bool)
+            for tile in list(self.enemy) + ["."]:
+                self.transient_table[ord(tile)] = True
+        self.terrain_table[ord(self.friendly_flag)] = 0 if self.holding_flag else 1
+        return self.terrain_table, self.transient_table
+
+    def fear_field(self):
+        """
+        Fear of the enemies enemy_tracker remembers, used by the pathfinding to keep away from them.
+        Sightings are deduplicated by position and the field is only rebuilt when the set of recent enemies changes,
+        so every agent of the team shares it.
+
+        Returns:
+            FearField: fear cost of every cell
+        """
+        self.enemy_tracker.expire(self.frame)
+        if self.current_fear_field is None or self.fear_field_version != self.enemy_tracker.version:
+            self.current_fear_field = FearField(HEIGHT, WIDTH, self.enemy_tracker.cells())
+            self.fear_field_version = self.enemy_tracker.version
+        return self.current_fear_field
+
+    def recent_threats(self, position, radius, max_age = None):
+        """
+        Enemies seen around a position lately, from enemy_tracker
+
+        Args:
+            position ( tuple of ints ): row and column to look around
+            radius ( float ): largest distance from `position`
+            max_age ( int ): only enemies seen in the last `max_age` frames, None for every remembered one
+
+        Returns:
+            list: row and column of the enemies, nearest first
+        """
+        self.enemy_tracker.expire(self.frame)
+        return self.enemy_tracker.within(position, radius, self.frame, max_age)
+
+    def path_distance(self, position, target, max_expansions = None, deadline = None):
+        """
+        Cost of the cheapest path between two positions in pathfinding_world, from the team's distance field of the target
+
+        Args:
+            position ( tuple of ints ): row and column of the start
+            target ( tuple of ints ): row and column of the target
+            max_expansions ( int ): most cells the field may expand to get up to date, None for no limit
+            deadline ( float ): time.perf_counter() the field has to stop at, None for no limit
+
+        Returns:
+            float: cost of the path, inf if the target can't be reached. The straight line distance while
+                   the field isn't done within the budget
+        """
+        distance = self.distance_fields.distance(position, target, max_expansions, deadline)
+        return math.dist(position, target) if distance is None else distance
+
     def find_regrup_spot(self, flag):
         """
         Function that is searching for a position where offensive agents will regroup after reaching target
@@ -253,18 +525,19 @@ class KnowlageBase:
             indices ( list ): list of positions of discovered bullets
         """
         indices = []
+        # only the enemies seen lately within shooting distance can be in the row or column
+        threats = [(row, col) for row, col in self.recent_threats((agent_pos_row, agent_pos_col), self.shoot_distance)
+                   if self.knowlage_base[row][col] in self.enemy]
 
         # Check the same row within 4 columns of the agent
-        for j in range(max(0, agent_pos_col - self.shoot_distance), min(len(self.knowlage_base[0]), agent_pos_col + self.shoot_distance + 1)):
-            if self.knowlage_base[agent_pos_row][j] in self.enemy:
-                if not any(self.knowlage_base[agent_pos_row][k] == '#' for k in range(min(j, agent_pos_col), max(j, agent_pos_col) + 1)):
-                    indices.append((agent_pos_row, j))
+        for _, j in sorted(threat for threat in threats if threat[0] == agent_pos_row):
+            if not any(self.knowlage_base[agent_pos_row][k] == '#' for k in range(min(j, agent_pos_col), max(j, agent_pos_col) + 1)):
+                indices.append((agent_pos_row, j))
 
         # Check the same column within 4 rows of the agent
-        for i in range(max(0, agent_pos_row - self.shoot_distance), min(len(self.knowlage_base), agent_pos_row + self.shoot_distance + 1)):
-            if self.knowlage_base[i][agent_pos_col] in self.enemy:
-                if not any(self.knowlage_base[k][agent_pos_col] == '#' for k in range(min(i, agent_pos_row), max(i, agent_pos_row) + 1)):
-                    indices.append((i, agent_pos_col))
+        for i, _ in sorted(threat for threat in threats if threat[1] == agent_pos_col):
+            if not any(self.knowlage_base[k][agent_pos_col] == '#' for k in range(min(i, agent_pos_row), max(i, agent_pos_row) + 1)):
+                indices.append((i, agent_pos_col))
 
         return indices
     
@@ -0,0 +1,56 @@
+"""
+What a team's knowledge base learned during one tick, see KnowlageBase.publish_changes.
+
+Every team publishes once per tick, from the agent_tick_done hook it registers (see team_hooks.py), after all
+its agents merged their vision and marked the enemies around them, so a change set holds what the whole team
+learned that tick. Subscribers get a ChangeSet and never have to compare pathfinding_world with an older copy:
+
+    def on_changes(changes):
+        for (row, col), (old, new) in changes.costs.items():
+            ...
+    red_agent.knowlage_base.subscribe(on_changes)
+
+The feed is for tools that look at the team's knowledge from outside (headless.py, overlays). The caches the
+agents plan with (path caches, distance fields, reachability, cluster graph) don't subscribe: they are told
+about every changed cell right when it changes (see KnowlageBase.register_path_cache), agents later in the same
+tick plan with them.
+
+headless.py streams the change sets of both teams as json lines:
+    python headless.py --seed 42 --knowledge-feed feed.jsonl
+"""
+
+
+class ChangeSet:
+    """
+    Changes of one knowledge base between two publishes.
+    """
+
+    def __init__(self):
+        self.tick = None      # world tick, set when published
+        self.discovered = []  # (row, col) of the cells seen for the first time
+        self.costs = {}       # (row, col) -> (old, new) value in pathfinding_world, cells that ended where they started are dropped
+        self.flags = {}       # "enemy_flag" / "friendly_flag" -> (row, col) where it was found
+        self.sightings = []   # (row, col) of the enemies seen, in the order they were seen
+
+    def cost_changed(self, cell, old, new):
+        if cell in self.costs:
+            old = self.costs[cell][0]
+        self.costs[cell] = (old, new)
+
+    def compact(self):
+        """
+        Drops the cost changes that were undone before the publish
+        """
+        self.costs = {cell: (old, new) for cell, (old, new) in self.costs.items() if old != new}
+
+    def __bool__(self):
+        return bool(self.discovered or self.costs or self.flags or self.sightings)
+
+    def to_dict(self):
+        return {
+            "tick": self.tick,
+            "discovered": [list(cell) for cell in self.discovered],
+            "costs": [[row, col, old, new] for (row, col), (old, new) in self.costs.items()],
+            "flags": {flag: list(position) for flag, position in self.flags.items()},
+            "sightings": [list(cell) for cell in self.sightings],
+        }
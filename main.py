@@ -1,20 +1,15 @@
-from tournament import World
 from config import *
+from replay import ReplayPlayer, ReplayRecorder
+import argparse
 import sys
+import time
 
 import pygame
-
-
-class Sprite(pygame.sprite.Sprite):
-    def __init__(self, image):
-        super().__init__()
-        self.image = image
-        self.rect = self.image.get_rect()
+from renderer import Renderer, TILE_SIZE
 
 
 pygame.init()
-screen = pygame.display.set_mode((WIDTH*32, HEIGHT*32))
-sprite_group = pygame.sprite.Group()
+screen = pygame.display.set_mode((WIDTH*TILE_SIZE, HEIGHT*TILE_SIZE))
 
 image_wall = pygame.image.load("sprites/wall.png").convert_alpha()
 image_blue_agent = pygame.image.load("sprites/blue_agent.png").convert_alpha()
@@ -24,9 +19,20 @@ image_red_agent_f = pygame.image.load("sprites/red_agent_f.png").convert_alpha()
 image_blue_flag = pygame.image.load("sprites/blue_flag.png").convert_alpha()
 image_red_flag = pygame.image.load("sprites/red_flag.png").convert_alpha()
 image_bullet = pygame.image.load("sprites/bullet.png").convert_alpha()
+tile_images = {
+    ASCII_TILES["wall"]: image_wall,
+    ASCII_TILES["blue_agent"]: image_blue_agent,
+    ASCII_TILES["red_agent"]: image_red_agent,
+    ASCII_TILES["blue_agent_f"]: image_blue_agent_f,
+    ASCII_TILES["red_agent_f"]: image_red_agent_f,
+    ASCII_TILES["blue_flag"]: image_blue_flag,
+    ASCII_TILES["red_flag"]: image_red_flag,
+    ASCII_TILES["bullet"]: image_bullet,
+}
+renderer = Renderer(screen, tile_images, ASCII_TILES["wall"])
 
 
-def handle_pygame(world):
+def handle_events():
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             pygame.quit()
@@ -36,57 +42,76 @@ def handle_pygame(world):
                 pygame.quit()
                 sys.exit()
 
-    sprite_group.empty()
-    for y in range(world.height):
-        for x in range(world.width):
-            sprite = None
-            if world.worldmap_buffer[y][x] == ASCII_TILES["wall"]:
-                sprite = Sprite(image_wall)
-            elif world.worldmap_buffer[y][x] == ASCII_TILES["blue_agent"]:
-                sprite = Sprite(image_blue_agent)
-            elif world.worldmap_buffer[y][x] == ASCII_TILES["red_agent"]:
-                sprite = Sprite(image_red_agent)
-            elif world.worldmap_buffer[y][x] == ASCII_TILES["blue_agent_f"]:
-                sprite = Sprite(image_blue_agent_f)
-            elif world.worldmap_buffer[y][x] == ASCII_TILES["red_agent_f"]:
-                sprite = Sprite(image_red_agent_f)
-            elif world.worldmap_buffer[y][x] == ASCII_TILES["blue_flag"]:
-                sprite = Sprite(image_blue_flag)
-            elif world.worldmap_buffer[y][x] == ASCII_TILES["red_flag"]:
-                sprite = Sprite(image_red_flag)
-            elif world.worldmap_buffer[y][x] == ASCII_TILES["bullet"]:
-                sprite = Sprite(image_bullet)
-            
-            if sprite:
-                sprite.rect.y = y * 32
-                sprite.rect.x = x * 32
-                sprite_group.add(sprite)
-
-    screen.fill((0, 0, 0))
-    sprite_group.draw(screen)
-    pygame.display.flip()
+
+def handle_pygame(world):
+    handle_events()
+    # only the tiles that changed this tick are redrawn
+    renderer.draw(world.worldmap_buffer, world.dirty_tiles)
+
+
+def draw_snapshot(buffer, dirty_tiles):
+    handle_events()
+    renderer.draw(buffer, dirty_tiles)
+
+
+def play_replay(path):
+    player = ReplayPlayer.load(path)
+    for frame in player.frames():
+        handle_pygame(frame)
+        time.sleep(TICK_RATE)
+    print(f"\n{player.winner or 'nobody'} won!\n")
 
 
 def main():
-    world = World(HEIGHT, WIDTH, TICK_RATE)
+    parser = argparse.ArgumentParser(description="Capture the flag.")
+    parser.add_argument("--record", default=None, help="save a replay of the game to this file")
+    parser.add_argument("--replay", default=None, help="watch a recorded game instead of playing one")
+    parser.add_argument("--threaded", action="store_true", help="simulate in a background thread, draw at --fps")
+    parser.add_argument("--fps", type=float, default=30, help="frames per second in threaded mode")
+    parser.add_argument("--fast", action="store_true", help="don't wait between ticks (use with --threaded)")
+    parser.add_argument("--decision-time", type=float, default=None,
+                        help="seconds the searches of one decision of an agent may take, on top of their expansion budget "
+                             "(the game then depends on how fast the machine is)")
+    args = parser.parse_args()
+
+    if args.replay:
+        play_replay(args.replay)
+        return
+
+    # imported here so that watching a replay doesn't load the agents
+    import pathfinding_agent
+    pathfinding_agent.DECISION_TIME = args.decision_time
+    from tournament import World
+    from headless import step
+    from clock import FastClock
+    from render_pipeline import run_threaded
+
+    world = World(HEIGHT, WIDTH, TICK_RATE, FastClock() if args.fast else None)
     world.generate_world()
+    recorder = ReplayRecorder() if args.record else None
+    if recorder:
+        recorder.start(world)
 
-    while not world.win:
-        world.check_win_state()
-        world.buffer_worldmap()
-        if world.tick % 5 == 0:
-            world.update_agents()
-        else:
-            world.update_bullets()
-        world.iter()
-        #world.ascii_display()
-        handle_pygame(world)
+    if args.threaded:
+        pipeline = run_threaded(world, step, draw_snapshot, args.fps, recorder.record if recorder else None)
+        print(f"\n{pipeline.published} ticks, {pipeline.drawn} frames drawn")
+    else:
+        while not world.win:
+            step(world)
+            if recorder:
+                recorder.record(world)
+            #world.ascii_display()
+            handle_pygame(world)
     
     world.terminate_agents()
+    if recorder:
+        recorder.finish(world)
+        recorder.save(args.record)
     
     if world.win == "tied":
         print("\ntied!\n")
     else:
         print(f"\n{world.win} won!\n")
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
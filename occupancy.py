@@ -0,0 +1,41 @@
+class Occupancy:
+    """
+    Which agents stand on which tile. Kept up to date by `World` when agents move or die, so looking up
+    the agents on a tile doesn't scan the whole agent list.
+    """
+
+    def __init__(self):
+        self.cells = {}      # (x, y) -> list of agents on that tile
+        self.positions = {}  # agent -> (x, y) it is stored under
+
+    def add(self, agent):
+        self.cells.setdefault(agent.position, []).append(agent)
+        self.positions[agent] = agent.position
+
+    def remove(self, agent):
+        position = self.positions.pop(agent)
+        cell = self.cells[position]
+        cell.remove(agent)
+        if not cell:
+            del self.cells[position]
+
+    def move(self, agent):
+        """
+        Moves the agent to its current position if it changed.
+        """
+        if self.positions.get(agent) != agent.position:
+            self.remove(agent)
+            self.add(agent)
+
+    def agents_at(self, position):
+        return self.cells.get(position, [])
+
+    def enemy_at(self, position, color, agents):
+        """
+        The agent a bullet of `color` hits on `position`, None if there is no enemy there.
+        If more enemies share the tile, it's the one latest in `agents` (the order the old scan used).
+        """
+        enemies = [agent for agent in self.cells.get(position, []) if agent.color != color]
+        if len(enemies) > 1:
+            return max(enemies, key=agents.index)
+        return enemies[0] if enemies else None
@@ -0,0 +1,180 @@
+import time
+import pathfinding_stats
+from collections import OrderedDict
+from dstar_lite import DStarLite
+from pathfinding_agent import STEP_EXTRA_COST, FEAR_KERNEL, FearField, astar_array
+
+DSTAR_EXPANSION_COST = 16  # A* expansions one D* Lite expansion costs about as much as (it updates up to five cells)
+PATHS_KEPT = 3             # paths a plan keeps, one for every agent of a team going to its target
+
+
+class PathPlanner:
+    """
+    Plan towards one target. Keeps the D* Lite search, which runs backwards from the target and so serves
+    any start, and the last paths it gave: one for every agent following the plan (up to PATHS_KEPT), so
+    agents of a team going to the same target don't take turns replacing each other's path.
+    Cells whose cost changed are collected in `pending` and only repaired when a path needs them.
+    A search that ran out of budget is continued by the next repair.
+    """
+
+    def __init__(self, start, goal, rows, cols, step_cost):
+        self.search = DStarLite(start, goal, rows, cols, step_cost)
+        self.paths = []  # oldest used first
+        self.pending = set()
+
+    def direction_path(self, start):
+        """
+        The rest of a kept path from `start`, None if the path has to be repaired first.
+        """
+        for i in range(len(self.paths) - 1, -1, -1):
+            path = self.paths[i]
+            if start in path:
+                rest = path[path.index(start):]
+                if self.pending.isdisjoint(rest):
+                    self.paths.append(self.paths.pop(i))
+                    return rest
+        return None
+
+    def repair(self, start, max_expansions = None, deadline = None):
+        """
+        Returns:
+            list: the repaired path, None if the search ran out of budget before it was done
+        """
+        self.search.move_start(start)
+        self.search.cells_changed(self.pending)
+        # the search no longer knows which cells changed, only the paths that avoid them all are kept
+        self.paths = [path for path in self.paths if self.pending.isdisjoint(path)]
+        self.pending = set()
+        if not self.search.compute(max_expansions, deadline):
+            return None
+        path = self.search.path()
+        self.paths = [kept for kept in self.paths if start not in kept] + [path]
+        if len(self.paths) > PATHS_KEPT:
+            self.paths.pop(0)
+        return path
+
+
+class PathCache:
+    """
+    Cache of plans, used by `pathfinding_direction` instead of running A* from scratch. Every agent has one
+    for its own targets, and the team shares one for the targets all agents go to: one search per target
+    for the whole team (see PathPlanner).
+
+    While the agent follows a path whose cells didn't change, the next step is read from the stored path.
+    Cells changed in the knowledge base (see `KnowlageBase.register_path_cache`) are handed to every plan
+    and repaired incrementally with D* Lite once they touch the path or the agent leaves it.
+    Enemy fear is folded into the cost of the cells around each (deduplicated) enemy sighting, a path costs
+    what astar_array(..., fear_in_cost=True) says it does (see benchmarks/path_cache.py).
+
+    Args:
+        size ( int ): number of targets to keep plans for
+    """
+
+    def __init__(self, size = 4):
+        self.size = size
+        self.planners = OrderedDict()  # target -> PathPlanner
+        self.grid = None
+        self.fear = {}           # (row, col) -> fear of all known enemies
+        self.enemies = set()
+        self.enemy_list = None   # the FearField or sighting list seen last, and how much of it was read
+        self.enemies_read = 0
+        self.hits = 0
+        self.repairs = 0
+        self.plans = 0
+        self.partial = 0
+
+    def cell_changed(self, cell):
+        for planner in self.planners.values():
+            planner.pending.add(cell)
+
+    def step_cost(self, cell):
+        extra = STEP_EXTRA_COST[self.grid[cell[0]][cell[1]]]
+        if extra is None:
+            return None
+        return 1 + extra + self.fear.get(cell, 0)
+
+    def _stamp(self, enemy, sign):
+        rows, cols = len(self.grid), len(self.grid[0])
+        for (dx, dy), fear in FEAR_KERNEL:
+            cell = (enemy[0] + dx, enemy[1] + dy)
+            if 0 <= cell[0] < rows and 0 <= cell[1] < cols:
+                value = self.fear.get(cell, 0) + sign * fear
+                if value > 1e-9:
+                    self.fear[cell] = value
+                else:
+                    self.fear.pop(cell, None)
+                self.cell_changed(cell)
+
+    def update_enemies(self, enemy_pos):
+        """
+        Brings the fear up to date with `enemy_pos` (a FearField, a list of sightings, or (None, None) for
+        no enemies). A list that only grew since the last call is read from where it was left.
+        """
+        if enemy_pos == (None, None):
+            enemy_pos = []
+        if isinstance(enemy_pos, FearField):
+            if enemy_pos is self.enemy_list:
+                return
+            enemies = set(enemy_pos.enemies)
+        elif enemy_pos is self.enemy_list and len(enemy_pos) >= self.enemies_read:
+            enemies = self.enemies | set(enemy_pos[self.enemies_read:])
+        else:
+            enemies = set(enemy_pos)
+        self.enemy_list = enemy_pos
+        self.enemies_read = len(enemy_pos)
+        if enemies == self.enemies:
+            return
+        for enemy in self.enemies - enemies:
+            self._stamp(enemy, -1)
+        for enemy in enemies - self.enemies:
+            self._stamp(enemy, 1)
+        self.enemies = enemies
+
+    def path(self, agent_pos, target_pos, grid, enemy_pos = (None, None), max_expansions = None, deadline = None):
+        """
+        Args:
+            agent_pos ( tuple ): row, col of the agent
+            target_pos ( tuple ): row, col of the target
+            grid ( list of lists ): pathfinding world, the same object on every call
+            enemy_pos ( FearField or list ): enemies to keep away from
+            max_expansions ( int ): most cells the searches may expand, None for no limit
+            deadline ( float ): time.perf_counter() by which the searches have to stop, None for no limit
+
+        Returns:
+            list: path from agent_pos to target_pos, [] if there is none. The budget is in A* expansions,
+                  the repair gets half of it (see DSTAR_EXPANSION_COST). If the repair runs out, an A* with what
+                  it left gives a partial path for this call, and the repair goes on where it stopped next time.
+                  Both count the fear of enemies in the cost of the path, so they agree on which path is cheapest.
+        """
+        if grid is not self.grid:
+            self.grid = grid
+            self.planners.clear()
+            self.fear = {}
+            self.enemies = set()
+            self.enemy_list = None
+        self.update_enemies(enemy_pos)
+
+        planner = self.planners.get(target_pos)
+        if planner is None:
+            self.plans += 1
+            planner = PathPlanner(agent_pos, target_pos, len(grid), len(grid[0]), self.step_cost)
+            self.planners[target_pos] = planner
+            if len(self.planners) > self.size:
+                self.planners.popitem(last=False)
+        else:
+            self.planners.move_to_end(target_pos)
+            path = planner.direction_path(agent_pos)
+            if path is not None:
+                self.hits += 1
+                return path
+            self.repairs += 1
+
+        now = time.perf_counter()
+        expanded = pathfinding_stats.expanded_total
+        path = planner.repair(agent_pos, max_expansions and max_expansions // (2 * DSTAR_EXPANSION_COST), deadline and (now + deadline) / 2)
+        if path is None:
+            self.partial += 1
+            if max_expansions is not None:
+                max_expansions = max(0, max_expansions - (pathfinding_stats.expanded_total - expanded) * DSTAR_EXPANSION_COST)
+            path = astar_array(agent_pos, target_pos, enemy_pos, grid, max_expansions, deadline, fear_in_cost=True)
+        return path
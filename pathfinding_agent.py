@@ -1,15 +1,28 @@
 import heapq
+import itertools
 import math 
+import time
+import pathfinding_stats
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 EMPTY_STEP_COST = 1
 MUD_STEP_COST = 10 # 10
 FEAR_OF_UNKNOWN = 6.66
 UNKNOWN_STEP_COST = max(EMPTY_STEP_COST, MUD_STEP_COST) * FEAR_OF_UNKNOWN  # for unknown positions (not visible)
 FEAR_OF_ENEMY = 10
+EXPANSION_BUDGET = 48000  # nodes the searches of one decision of an agent may expand together
+DECISION_TIME = None  # seconds the searches of one decision of an agent may take together, None for no limit
+                      #   (a limit makes the game depend on the machine, see main.py --decision-time)
+HIERARCHY_MIN_CELLS = 20000  # maps with at least this many cells are searched through the cluster graph (see hpa.py)
 
 # Function to find the shortest path from agent_pos to target_pos on the given grid,
 #   and return direction in which the agent should move
-def pathfinding_direction(agent_pos, target_pos, grid, enemy_pos = (None, None)):
+def pathfinding_direction(agent_pos, target_pos, grid, enemy_pos = (None, None), cache = None, fields = None, reachability = None,
+                          max_expansions = None, deadline = None, hierarchy = None):
     # args:
     #   agent_pos (tuple): agent coordinates
     #   target_pos (tuple): target coordinates
@@ -19,14 +32,108 @@ def pathfinding_direction(agent_pos, target_pos, grid, enemy_pos = (None, None))
     #       0 -> empty space (" ")
     #       1 -> obstacle (#)
     #       2 -> enemy
+    #   cache (PathCache): the agent's cache of plans, reused and repaired incrementally instead of
+    #       running A* from scratch (see path_cache.py)
+    #   fields (DistanceFields): the team's distance fields, the next step is looked up in the target's field
+    #       when there are no enemies to be afraid of and the field is done (see distance_field.py)
+    #   reachability (ReachabilityIndex): targets it knows can't be reached return None without a search
+    #   max_expansions (int): most nodes the searches may expand, None for no limit
+    #   deadline (float): time.perf_counter() by which the searches have to stop, None for no limit
+    #       both are shared by every search of the call (see SearchBudget): each one is given what the ones before
+    #       it left, the rebuilds of the reachability index and the fields at most half of it so the path search
+    #       always gets its turn. When they run out, the agent heads towards the best node the last search got to
+    #   hierarchy (ClusterGraph): on maps of at least HIERARCHY_MIN_CELLS cells the path goes through the team's
+    #       cluster graph, only the part in the agent's cluster is searched cell by cell (see hpa.py). If the graph
+    #       can't be brought up to date within the budget, the search below is used with what is left
     # return: direction, shortest_path
     #   direction: direction in which the agent will move, such as 'RIGHT', 'LEFT', 'UP', or 'DOWN'
     #   shortest_path: a list of coordinates (tuples) for visualization of the path, such as [(1, 3), (2, 3), ...]
     
-    shortest_path = astar(agent_pos, target_pos, enemy_pos, grid)
+    budget = SearchBudget(max_expansions, deadline)
+    if reachability is not None and not reachability.reachable(agent_pos, target_pos, budget.expansions(0.5), budget.until(0.5)):
+        return None
+    no_enemies = enemy_pos == (None, None) or len(enemy_pos) == 0
+    # a field only helps if it can be done within the budget, its search covers the whole grid
+    small_grid = max_expansions is None or len(grid) * len(grid[0]) <= budget.expansions(0.5)
+    if fields is not None and small_grid and no_enemies:
+        field = fields.field(target_pos)
+        if field is not None and field.update(budget.expansions(0.5), budget.until(0.5)):
+            next_pos = field.next_step(agent_pos)
+            if pathfinding_stats.active is not None:
+                pathfinding_stats.active.path_found(None)
+            return get_direction(agent_pos, [agent_pos, next_pos] if next_pos else [])
+    if hierarchy is not None and len(grid) * len(grid[0]) >= HIERARCHY_MIN_CELLS:
+        shortest_path = hierarchy.path(agent_pos, target_pos, enemy_pos if isinstance(enemy_pos, FearField) else None,
+                                       budget.expansions(), deadline)
+        if shortest_path:
+            if pathfinding_stats.active is not None:
+                pathfinding_stats.active.path_found(shortest_path)
+            return get_direction(agent_pos, shortest_path)
+    if cache is not None:
+        shortest_path = cache.path(agent_pos, target_pos, grid, enemy_pos, budget.expansions(), deadline)
+    else:
+        shortest_path = astar_array(agent_pos, target_pos, enemy_pos, grid, budget.expansions(), deadline)
+    if pathfinding_stats.active is not None:
+        pathfinding_stats.active.path_found(shortest_path)
     direction = get_direction(agent_pos, shortest_path)
     return direction
 
+class SearchBudget:
+    """
+    What the searches of one decision of an agent (or one pathfinding_direction call) may spend together. Every
+    search adds what it expanded to pathfinding_stats.expanded_total when it stops, what is left for the next one
+    is the budget minus what was added since the budget was made.
+
+    Args:
+        max_expansions ( int ): most nodes all the searches may expand, None for no limit
+        deadline ( float ): time.perf_counter() by which they have to stop, None for no limit
+    """
+
+    def __init__(self, max_expansions = None, deadline = None):
+        self.max_expansions = max_expansions
+        self.deadline = deadline
+        self.start = pathfinding_stats.expanded_total
+
+    def expansions(self, share = 1):
+        """
+        Args:
+            share ( float ): part of what is left the next search may use
+
+        Returns:
+            int: nodes the next search may expand, None for no limit
+        """
+        if self.max_expansions is None:
+            return None
+        return int(max(0, self.max_expansions - (pathfinding_stats.expanded_total - self.start)) * share)
+
+    def until(self, share = 1):
+        """
+        Args:
+            share ( float ): part of the time left the next search may use
+
+        Returns:
+            float: time.perf_counter() by which the next search has to stop, None for no limit
+        """
+        if self.deadline is None:
+            return None
+        now = time.perf_counter()
+        return now + max(0, self.deadline - now) * share
+
+    def exhausted(self):
+        """
+        Returns:
+            bool: True if there are no expansions or no time left
+        """
+        return self.expansions() == 0 or self.deadline is not None and time.perf_counter() > self.deadline
+
+
+def decision_budget():
+    """
+    Returns:
+        SearchBudget: budget of one decision of an agent, EXPANSION_BUDGET expansions and DECISION_TIME seconds from now
+    """
+    return SearchBudget(EXPANSION_BUDGET, None if DECISION_TIME is None else time.perf_counter() + DECISION_TIME)
+
 # Determine the direction from the current position to the next position along the shortest path:
 def get_direction(current_pos, shortest_path):
     '''
@@ -119,6 +226,121 @@ def astar(agent_pos, target_pos, enemy_pos, grid):
     # If the goal is not reached, return an empty path
     return []  # Target not reachable
 
+# Neighbour table of a flattened grid: for each cell index, indices of the neighbours in the same order
+#   as `astar` visits them (x+1, x-1, y+1, y-1), only those inside the grid
+_neighbor_tables = {}
+
+def neighbor_table(rows, cols):
+    table = _neighbor_tables.get((rows, cols))
+    if table is None:
+        table = []
+        for x in range(rows):
+            for y in range(cols):
+                neighbors = []
+                if x + 1 < rows: neighbors.append((x+1)*cols + y)
+                if x - 1 >= 0:   neighbors.append((x-1)*cols + y)
+                if y + 1 < cols: neighbors.append(x*cols + y + 1)
+                if y - 1 >= 0:   neighbors.append(x*cols + y - 1)
+                table.append(tuple(neighbors))
+        _neighbor_tables[(rows, cols)] = table
+    return table
+
+# extra cost of stepping on a tile (on top of the 1 every step costs), None for obstacles
+STEP_EXTRA_COST = {0: 0, 1: None, 2: MUD_STEP_COST, -1: UNKNOWN_STEP_COST}
+
+
+# A* on a flattened grid, returns exactly the same path as `astar`:
+#   costs and parents are preallocated arrays indexed by x*cols + y instead of dicts of tuples,
+#   neighbours come from a precomputed table, and a node whose cost hasn't improved since it was
+#   expanded is skipped when popped again (expanding it again couldn't change anything)
+# With `max_expansions` or `deadline` (a time.perf_counter() value) the search is anytime: when it runs out,
+#   it returns the path to the open node with the lowest f instead of the path to the target
+# With `fear_in_cost` the fear of enemies is added to the cost of stepping on a cell instead of to the f of the
+#   node, so the cost of the path is the one path_cache.PathCache plans with
+def astar_array(agent_pos, target_pos, enemy_pos, grid, max_expansions = None, deadline = None, fear_in_cost = False):
+    rows, cols = len(grid), len(grid[0])
+    goal_x, goal_y = target_pos
+    if not (0 <= goal_x < rows and 0 <= goal_y < cols):
+        return []
+    start = agent_pos[0]*cols + agent_pos[1]
+    goal = goal_x*cols + goal_y
+
+    cells = list(itertools.chain.from_iterable(grid))
+    neighbors = neighbor_table(rows, cols)
+    size = rows * cols
+    g_cost = [math.inf] * size
+    expanded_cost = [-1] * size
+    came_from = [-1] * size
+    heuristic_cost = [None] * size
+    g_cost[start] = 0
+
+    fear = enemy_pos.values if isinstance(enemy_pos, FearField) and len(enemy_pos) > 0 else None
+    with_enemies = enemy_pos != (None, None) and len(enemy_pos) > 0
+    step_fear = None
+    if fear_in_cost and with_enemies:
+        step_fear = fear if fear is not None else FearField(rows, cols, enemy_pos).values
+        fear, with_enemies = None, False
+    open_set = [(0, start)]
+    heappush, heappop, dist, perf_counter = heapq.heappush, heapq.heappop, math.dist, time.perf_counter
+    expansions = pushes = 0
+
+    def path_to(current):
+        pathfinding_stats.searched(expansions, pushes)
+        path = []
+        while current != start:
+            path.append(divmod(current, cols))
+            current = came_from[current]
+        path.append(agent_pos)
+        path.reverse()
+        return path
+
+    while open_set:
+        _, current = heappop(open_set)
+        if current == goal:
+            return path_to(current)
+
+        current_cost = g_cost[current]
+        if expanded_cost[current] == current_cost:
+            continue
+        if max_expansions is not None and expansions >= max_expansions \
+        or deadline is not None and expansions % 64 == 0 and perf_counter() > deadline:
+            # out of budget, `current` is the open node with the lowest f
+            return path_to(current)
+        expansions += 1
+        expanded_cost[current] = current_cost
+
+        for neighbor in neighbors[current]:
+            extra = STEP_EXTRA_COST[cells[neighbor]]
+            if extra is None:
+                continue
+            tentative_g_cost = current_cost + 1
+            if extra:
+                tentative_g_cost += extra
+            if step_fear is not None:
+                tentative_g_cost += step_fear[neighbor]
+            if tentative_g_cost < g_cost[neighbor]:
+                g_cost[neighbor] = tentative_g_cost
+                h = heuristic_cost[neighbor]
+                if h is None:
+                    position = divmod(neighbor, cols)
+                    h = dist(position, target_pos)
+                    if fear is not None:
+                        h = (h, fear[neighbor])
+                    elif with_enemies:
+                        # the fear of enemies only depends on the position, sum it once per node
+                        h = (h, sum(fear_of_enemy(position, enemy) for enemy in enemy_pos))
+                    heuristic_cost[neighbor] = h
+                if with_enemies:
+                    total_cost = tentative_g_cost + h[0] + h[1]
+                else:
+                    total_cost = tentative_g_cost + h
+                heappush(open_set, (total_cost, neighbor))
+                pushes += 1
+                came_from[neighbor] = current
+
+    pathfinding_stats.searched(expansions, pushes)
+    return []  # Target not reachable
+
 # Reconstruct the path from the target to the start using parent information:
 def reconstruct_path(came_from, start, target):
     '''
@@ -155,3 +377,60 @@ def fear_of_enemy(current, enemy):
         return 0
     multiplier = FEAR_OF_ENEMY / ((dist + 1))
     return  multiplier * FEAR_OF_ENEMY *1000
+
+
+# fear of an enemy at (0, 0) for every offset within FEAR_OF_ENEMY
+FEAR_KERNEL = [((dx, dy), fear_of_enemy((dx, dy), (0, 0)))
+               for dx in range(-FEAR_OF_ENEMY, FEAR_OF_ENEMY + 1)
+               for dy in range(-FEAR_OF_ENEMY, FEAR_OF_ENEMY + 1)
+               if fear_of_enemy((dx, dy), (0, 0)) > 0]
+
+
+class FearField:
+    """
+    Summed fear_of_enemy of a set of enemies for every cell of the grid, computed once so A* looks the
+    fear of a node up instead of summing it over every enemy. Can be passed anywhere a list of enemy
+    positions is expected (iterating it gives the enemies).
+
+    Args:
+        rows, cols ( int ): size of the grid
+        enemies ( iterable of tuples ): row, col of the enemies, duplicates are ignored
+    """
+
+    def __init__(self, rows, cols, enemies):
+        self.rows = rows
+        self.cols = cols
+        self.enemies = frozenset(enemies)
+        self.values = self._numpy_values() if np is not None else self._python_values()  # indexed row*cols + col
+
+    def _python_values(self):
+        values = [0] * (self.rows * self.cols)
+        for enemy_row, enemy_col in self.enemies:
+            for (dx, dy), fear in FEAR_KERNEL:
+                row, col = enemy_row + dx, enemy_col + dy
+                if 0 <= row < self.rows and 0 <= col < self.cols:
+                    values[row*self.cols + col] += fear
+        return values
+
+    def _numpy_values(self):
+        if not self.enemies:
+            return [0] * (self.rows * self.cols)
+        # stamp the kernel around every enemy at once on a grid padded by the radius, so nothing is clipped
+        r = FEAR_OF_ENEMY
+        width = self.cols + 2*r
+        offsets = np.array([dx*width + dy for (dx, dy), _ in FEAR_KERNEL])
+        fears = np.array([fear for _, fear in FEAR_KERNEL])
+        enemies = np.array(sorted(self.enemies))
+        centers = (enemies[:, 0] + r) * width + enemies[:, 1] + r
+        cells = (centers[:, None] + offsets[None, :]).ravel()
+        padded = np.bincount(cells, weights=np.tile(fears, len(enemies)), minlength=(self.rows + 2*r) * width)
+        return padded.reshape(self.rows + 2*r, width)[r:r + self.rows, r:r + self.cols].ravel().tolist()
+
+    def fear(self, position):
+        return self.values[position[0]*self.cols + position[1]]
+
+    def __iter__(self):
+        return iter(self.enemies)
+
+    def __len__(self):
+        return len(self.enemies)
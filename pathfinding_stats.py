@@ -0,0 +1,211 @@
+"""
+Instrumentation of the agents' pathfinding.
+
+While enabled, every `Agent.path_direction` call is recorded under its call site ("search/corner",
+"defend_flag", "regroup", ...) and the agent that made it: nodes expanded and heap pushes of every search
+that ran for it (A*, D* Lite repairs, distance fields, the cluster graph), length of the path it found,
+whether it found one, and how long it took. Values go into in-memory histograms with power of two buckets.
+
+Disabled (the default) nothing is recorded: the searches only add what they expanded to `expanded_total`
+when they finish (what pathfinding_agent.SearchBudget counts) and path_direction calls straight through.
+
+Usage:
+    python headless.py --seed 42 --pathfinding-stats stats.json
+
+    import pathfinding_stats
+    stats = pathfinding_stats.enable()
+    ...  # play a game
+    pathfinding_stats.disable()
+    print(stats.report())
+    stats.dump("stats.json")
+"""
+
+import json
+import math
+
+METRICS = ["expanded", "pushes", "path_length", "latency_us"]
+
+active = None  # PathfindingStats being recorded into, None while disabled
+expanded_total = 0  # nodes expanded by all searches so far, recorded or not
+
+
+class Histogram:
+    """
+    Counts of values in power of two buckets: a value v > 0 goes into the bucket 2**ceil(log2(v)),
+    values <= 0 into bucket 0.
+    """
+
+    def __init__(self):
+        self.buckets = {}  # upper bound -> count
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        bucket = 0 if value <= 0 else 2 ** math.ceil(math.log2(value))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def percentile(self, fraction):
+        """
+        Returns:
+            int: upper bound of the bucket the `fraction` quantile falls into
+        """
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= fraction * self.count:
+                return bucket
+        return 0
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean(), "max": self.max,
+                "buckets": {str(bucket): count for bucket, count in sorted(self.buckets.items())}}
+
+
+class CallStats:
+    """
+    Everything recorded for one call site of one agent.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.found = 0
+        self.histograms = {metric: Histogram() for metric in METRICS}
+
+    def to_dict(self):
+        result = {"calls": self.calls, "found": self.found, "failed": self.calls - self.found}
+        result.update({metric: histogram.to_dict() for metric, histogram in self.histograms.items()})
+        return result
+
+
+class PathfindingStats:
+    """
+    Recorded pathfinding calls, see the module docstring.
+    """
+
+    def __init__(self):
+        self.calls = {}  # (call site, agent) -> CallStats
+        self.expanded = 0
+        self.pushes = 0
+        self.path_length = None
+
+    def begin(self):
+        # start of a call, searches made from now on are counted for it
+        self.expanded = 0
+        self.pushes = 0
+        self.path_length = None
+
+    def searched(self, expanded, pushes):
+        """
+        Called by a search when it stops
+        """
+        self.expanded += expanded
+        self.pushes += pushes
+
+    def path_found(self, path):
+        """
+        Called by pathfinding_direction with the path it steers along (None for a distance field step)
+        """
+        self.path_length = len(path) if path is not None else None
+
+    def record(self, call_site, agent, direction, latency):
+        """
+        End of a call
+
+        Args:
+            call_site ( str ): what the agent was planning for
+            agent ( str ): color and index of the agent, like "red 1"
+            direction ( str ): direction the call returned, None if it found no path
+            latency ( float ): seconds the call took
+        """
+        stats = self.calls.get((call_site, agent))
+        if stats is None:
+            stats = self.calls[(call_site, agent)] = CallStats()
+        stats.calls += 1
+        stats.found += direction is not None
+        stats.histograms["expanded"].add(self.expanded)
+        stats.histograms["pushes"].add(self.pushes)
+        if self.path_length is not None:
+            stats.histograms["path_length"].add(self.path_length)
+        stats.histograms["latency_us"].add(latency * 1e6)
+
+    def by_call_site(self):
+        """
+        Returns:
+            dict: call site -> CallStats of all agents together
+        """
+        merged = {}
+        for (call_site, _), stats in self.calls.items():
+            total = merged.setdefault(call_site, CallStats())
+            total.calls += stats.calls
+            total.found += stats.found
+            for metric, histogram in stats.histograms.items():
+                into = total.histograms[metric]
+                for bucket, count in histogram.buckets.items():
+                    into.buckets[bucket] = into.buckets.get(bucket, 0) + count
+                into.count += histogram.count
+                into.total += histogram.total
+                into.max = max(into.max, histogram.max)
+        return merged
+
+    def to_dict(self):
+        return {
+            "call_sites": {call_site: stats.to_dict() for call_site, stats in sorted(self.by_call_site().items())},
+            "agents": [dict(call_site=call_site, agent=agent, **stats.to_dict()) for (call_site, agent), stats in sorted(self.calls.items())],
+        }
+
+    def dump(self, path):
+        """
+        Writes the histograms as json
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    def report(self):
+        """
+        Returns:
+            str: table of the call sites, what they cost in total and per call
+        """
+        lines = [f"{'call site':24s} {'calls':>7} {'failed':>7} {'total ms':>9} {'mean us':>8} {'p99 us':>8} {'expanded':>9} {'pushes':>9} {'length':>7}"]
+        for call_site, stats in sorted(self.by_call_site().items(), key=lambda item: -item[1].histograms["latency_us"].total):
+            latency = stats.histograms["latency_us"]
+            lines.append(f"{call_site:24s} {stats.calls:>7} {stats.calls - stats.found:>7} {latency.total / 1e3:>9.1f} {latency.mean():>8.0f} "
+                         f"{latency.percentile(0.99):>8} {stats.histograms['expanded'].mean():>9.1f} {stats.histograms['pushes'].mean():>9.1f} "
+                         f"{stats.histograms['path_length'].mean():>7.1f}")
+        return "\n".join(lines)
+
+
+def searched(expanded, pushes):
+    """
+    Called by every search when it stops
+    """
+    global expanded_total
+    expanded_total += expanded
+    if active is not None:
+        active.searched(expanded, pushes)
+
+
+def enable(stats = None):
+    """
+    Starts recording
+
+    Args:
+        stats ( PathfindingStats ): where to record, a new one if None
+
+    Returns:
+        PathfindingStats: where the calls are recorded
+    """
+    global active
+    active = stats if stats is not None else PathfindingStats()
+    return active
+
+
+def disable():
+    global active
+    active = None
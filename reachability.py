@@ -0,0 +1,251 @@
+import random
+import time
+import pathfinding_stats
+from collections import deque
+from pathfinding_agent import neighbor_table
+
+# the 8 cells around a cell in walking order, consecutive ones are next to each other
+RING = [(-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1)]
+LOCAL_SEARCH = 64  # cells searched around a closed cell for another way between its neighbours
+
+
+class ReachabilityIndex:
+    """
+    Connected components (union-find) of the cells of pathfinding_world an agent could walk through:
+    everything except obstacles, unknown cells included. Answers whether a target can be reached at all
+    without a search.
+
+    A cell that opens gets a new node joined with its neighbours right away (the old node may still hold
+    a component together, union-find can't take it out). A cell that closes can split its component,
+    unless its open neighbours are still connected around it or through a small search nearby, then the
+    components are rebuilt lazily on the next query. The rebuild can be given a budget, one that isn't done yet
+    is continued by the next query (which can't tell a target is unreachable until then).
+
+    Args:
+        grid ( list of lists ): pathfinding world
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.rows = len(grid)
+        self.cols = len(grid[0])
+        self.open = None
+        self.node = None    # cell -> its node in parent
+        self.parent = None
+        self.seen = None
+        self.next_root = 0  # cells before it are filled or obstacles
+        self.root = None    # component being filled
+        self.stack = None
+        self.dirty = True
+        self.complete = False
+        self.builds = 0
+
+    def _open(self, row, col):
+        return 0 <= row < self.rows and 0 <= col < self.cols and self.open[row*self.cols + col]
+
+    def _find_cell(self, row, col):
+        return self.find(self.node[row*self.cols + col])
+
+    def find(self, cell):
+        parent = self.parent
+        root = cell
+        while parent[root] != root:
+            root = parent[root]
+        while parent[cell] != root:
+            parent[cell], cell = root, parent[cell]
+        return root
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[b] = a
+
+    def build(self, max_expansions = None, deadline = None):
+        """
+        Flood fills every component, all its cells point straight at its first cell. Continues the fill
+        that ran out of budget last time, from scratch if the grid changed in a way it can't follow.
+
+        Args:
+            max_expansions ( int ): most cells to fill, None for no limit
+            deadline ( float ): time.perf_counter() to stop at, None for no limit
+
+        Returns:
+            bool: True if the components are done
+        """
+        if self.dirty:
+            self.open = [value != 1 for row in self.grid for value in row]
+            self.node = list(range(len(self.open)))
+            self.parent = list(range(len(self.open)))
+            self.seen = bytearray(len(self.open))
+            self.next_root = 0
+            self.stack = []
+            self.dirty = False
+            self.complete = False
+        open_cells, parent, seen, stack = self.open, self.parent, self.seen, self.stack
+        neighbors = neighbor_table(self.rows, self.cols)
+        expansions = 0
+        while True:
+            if not stack:
+                while self.next_root < len(open_cells) and (seen[self.next_root] or not open_cells[self.next_root]):
+                    self.next_root += 1
+                if self.next_root == len(open_cells):
+                    break
+                self.root = self.next_root
+                seen[self.root] = 1
+                stack.append(self.root)
+            if max_expansions is not None and expansions >= max_expansions \
+            or deadline is not None and expansions % 64 == 0 and time.perf_counter() > deadline:
+                pathfinding_stats.searched(expansions, 0)
+                return False
+            expansions += 1
+            cell = stack.pop()
+            parent[cell] = self.root
+            for neighbor in neighbors[cell]:
+                if not seen[neighbor] and open_cells[neighbor]:
+                    seen[neighbor] = 1
+                    stack.append(neighbor)
+        self.complete = True
+        self.builds += 1
+        pathfinding_stats.searched(expansions, 0)
+        return True
+
+    def cell_changed(self, cell):
+        if self.dirty:
+            return
+        row, col = cell
+        index = row*self.cols + col
+        is_open = self.grid[row][col] != 1
+        if is_open == self.open[index]:
+            return
+        if not self.complete:
+            # the fill follows cells it hasn't got to yet, and closed cells that can't split anything
+            if is_open and (self.seen[index] or any(self.seen[neighbor] for neighbor in neighbor_table(self.rows, self.cols)[index])):
+                self.dirty = True
+            elif not is_open and self.seen[index]:
+                self.open[index] = False
+                if not self._ring_connected(row, col) and not self._locally_connected(index):
+                    self.dirty = True
+            else:
+                self.open[index] = is_open
+            return
+        self.open[index] = is_open
+        if is_open:
+            self.node[index] = len(self.parent)
+            self.parent.append(self.node[index])
+            for x, y in [(row+1, col), (row-1, col), (row, col+1), (row, col-1)]:
+                if self._open(x, y):
+                    self.union(self.node[index], self.node[x*self.cols + y])
+        elif not self._ring_connected(row, col) and not self._locally_connected(index):
+            self.dirty = True
+            self.complete = False
+
+    def _ring_connected(self, row, col):
+        # open neighbours in one unbroken run of open cells around (row, col) stay connected without it
+        ring = [self._open(row + dx, col + dy) for dx, dy in RING]
+        if all(ring):
+            return True
+        start = ring.index(False)
+        runs_with_neighbours = 0
+        in_run = has_neighbour = False
+        for i in range(start, start + len(RING)):
+            if ring[i % len(RING)]:
+                in_run = True
+                has_neighbour = has_neighbour or i % 2 == 1  # odd positions are the 4 neighbours
+            elif in_run:
+                runs_with_neighbours += has_neighbour
+                in_run = has_neighbour = False
+        runs_with_neighbours += in_run and has_neighbour
+        return runs_with_neighbours <= 1
+
+    def _locally_connected(self, index):
+        # searches from one open neighbour for the others, giving up after LOCAL_SEARCH cells
+        neighbors = neighbor_table(self.rows, self.cols)
+        targets = {neighbor for neighbor in neighbors[index] if self.open[neighbor]}
+        if len(targets) < 2:
+            return True
+        start = targets.pop()
+        seen = {start}
+        queue = deque([start])
+        while queue and len(seen) <= LOCAL_SEARCH:
+            cell = queue.popleft()
+            for neighbor in neighbors[cell]:
+                if neighbor not in seen and self.open[neighbor]:
+                    targets.discard(neighbor)
+                    if not targets:
+                        return True
+                    seen.add(neighbor)
+                    queue.append(neighbor)
+        return False
+
+    def update(self, max_expansions = None, deadline = None):
+        """
+        Returns:
+            bool: True if the components are up to date, see build
+        """
+        if self.dirty or not self.complete:
+            return self.build(max_expansions, deadline)
+        return True
+
+    def component(self, position):
+        """
+        The components have to be up to date (see update).
+
+        Returns:
+            int: label of the component of `position`, None if it's an obstacle
+        """
+        index = position[0]*self.cols + position[1]
+        if not self.open[index]:
+            return None
+        return self.find(self.node[index])
+
+    def _start_components(self, start):
+        # the agent may stand on a cell marked as an obstacle (its own flag), it can still leave it
+        own = self.component(start)
+        if own is not None:
+            return {own}
+        row, col = start
+        return {self._find_cell(x, y) for x, y in [(row+1, col), (row-1, col), (row, col+1), (row, col-1)] if self._open(x, y)}
+
+    def reachable(self, start, target, max_expansions = None, deadline = None):
+        """
+        Whether a path from `start` to `target` can exist
+
+        Args:
+            start ( tuple ): row, col of the agent
+            target ( tuple ): row, col of the target
+            max_expansions ( int ): most cells the rebuild of the components may fill, None for no limit
+            deadline ( float ): time.perf_counter() the rebuild has to stop at, None for no limit
+
+        Returns:
+            bool: False if no search could reach the target, True while the components aren't rebuilt yet
+        """
+        if not (0 <= target[0] < self.rows and 0 <= target[1] < self.cols):
+            return False
+        if not self.update(max_expansions, deadline):
+            return True
+        goal = self.component(target)
+        return goal is not None and goal in self._start_components(start)
+
+    def random_position(self, start, row_range, col_range, rng = random, max_expansions = None, deadline = None):
+        """
+        Random cell in the given rows and columns that can be reached from `start` (other than `start`).
+        While the components aren't rebuilt yet any cell that isn't an obstacle is picked.
+
+        Args:
+            start ( tuple ): row, col of the agent
+            row_range ( range ): rows to pick from
+            col_range ( range ): columns to pick from
+            rng ( random.Random ): source of randomness
+            max_expansions ( int ): most cells the rebuild of the components may fill, None for no limit
+            deadline ( float ): time.perf_counter() the rebuild has to stop at, None for no limit
+
+        Returns:
+            tuple: row, col of the cell, None if no cell there can be reached
+        """
+        if not self.update(max_expansions, deadline):
+            cells = [(row, col) for row in row_range for col in col_range if self.grid[row][col] != 1 and (row, col) != start]
+            return rng.choice(cells) if cells else None
+        components = self._start_components(start)
+        cells = [(row, col) for row in row_range for col in col_range
+                 if self.open[row*self.cols + col] and self._find_cell(row, col) in components and (row, col) != start]
+        return rng.choice(cells) if cells else None
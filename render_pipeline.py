@@ -0,0 +1,149 @@
+"""
+Decouples the simulation from drawing. The simulation publishes an immutable `Snapshot` after every tick,
+the drawing loop picks up the newest one at a fixed FPS. Snapshots published between two drawn frames are
+merged, so frames are dropped when drawing falls behind, but no changed tile is ever lost.
+"""
+
+import threading
+import time
+
+
+class Snapshot:
+    """
+    State of one tick, safe to hand to another thread.
+
+    Args:
+        tick ( int ): tick of the world
+        full ( tuple of tuples ): the whole buffer, only when the receiver needs to start from scratch
+        changes ( tuple ): ((x, y), tile) of tiles that changed since the previous snapshot
+        win ( str ): World.win
+    """
+
+    def __init__(self, tick, full, changes, win):
+        self.tick = tick
+        self.full = full
+        self.changes = changes
+        self.win = win
+
+    @classmethod
+    def from_world(cls, world):
+        buffer = world.worldmap_buffer
+        if world.dirty_tiles is None:
+            full = tuple(tuple(row) for row in buffer)
+            changes = ()
+        else:
+            full = None
+            changes = tuple(((x, y), buffer[y][x]) for x, y in world.dirty_tiles)
+        return cls(world.tick, full, changes, world.win)
+
+    def merge(self, newer):
+        """
+        One snapshot with the changes of both (`newer` wins where they overlap).
+        """
+        if newer.full is not None:
+            return newer
+        changes = dict(self.changes)
+        changes.update(newer.changes)
+        return Snapshot(newer.tick, self.full, tuple(changes.items()), newer.win)
+
+
+class RenderPipeline:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = None
+        self.closed = False
+        self.published = 0
+        self.drawn = 0
+
+    def publish(self, world):
+        """
+        Called by the simulation after every tick.
+        """
+        snapshot = Snapshot.from_world(world)
+        with self.lock:
+            self.pending = snapshot if self.pending is None else self.pending.merge(snapshot)
+            self.published += 1
+
+    def close(self):
+        """
+        Called by the simulation when the game is over, `run` returns after drawing the last snapshot.
+        """
+        self.closed = True
+
+    def take(self):
+        with self.lock:
+            snapshot, self.pending = self.pending, None
+        return snapshot
+
+    def run(self, draw, fps):
+        """
+        Draws the newest snapshot `fps` times per second until the pipeline is closed.
+
+        Args:
+            draw ( callable ): called with a buffer (list of lists) and the set of (x, y) that changed
+                               since the last call (None when everything has to be drawn)
+            fps ( float ): frames per second
+        """
+        buffer = None
+        frame_time = 1 / fps
+        while True:
+            start = time.perf_counter()
+            closed = self.closed
+            snapshot = self.take()
+            if snapshot:
+                dirty_tiles = set()
+                if snapshot.full is not None:
+                    buffer = [list(row) for row in snapshot.full]
+                    dirty_tiles = None
+                for (x, y), tile in snapshot.changes:
+                    buffer[y][x] = tile
+                    if dirty_tiles is not None:
+                        dirty_tiles.add((x, y))
+                draw(buffer, dirty_tiles)
+                self.drawn += 1
+            elif closed:
+                return
+            time.sleep(max(0, frame_time - (time.perf_counter() - start)))
+
+
+def run_threaded(world, step, draw, fps, on_tick = None):
+    """
+    Runs the game in a background thread and draws it from the calling thread (pygame wants its window
+    and events handled by the thread that created them).
+
+    Args:
+        world ( World ): a generated world
+        step ( callable ): advances the world by one tick (headless.step)
+        draw ( callable ): see RenderPipeline.run
+        fps ( float ): frames per second of the display
+        on_tick ( callable ): called with the world after every tick, in the simulation thread
+
+    Returns:
+        RenderPipeline: with the number of published and drawn frames
+
+    Raises:
+        whatever the simulation thread raised, once the frames before it are drawn
+    """
+    pipeline = RenderPipeline()
+    error = []
+
+    def simulate():
+        try:
+            while not world.win:
+                step(world)
+                if on_tick:
+                    on_tick(world)
+                pipeline.publish(world)
+        except BaseException as exception:
+            error.append(exception)
+        finally:
+            pipeline.close()
+
+    thread = threading.Thread(target=simulate, daemon=True)
+    thread.start()
+    pipeline.run(draw, fps)
+    thread.join()
+    if error:
+        raise error[0]
+    return pipeline
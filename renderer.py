@@ -0,0 +1,88 @@
+import pygame
+
+TILE_SIZE = 32
+
+
+class Sprite(pygame.sprite.Sprite):
+    def __init__(self, image):
+        super().__init__()
+        self.image = image
+        self.rect = self.image.get_rect()
+
+
+class Renderer:
+    """
+    Draws the buffered worldmap in two layers: walls are blitted once onto a cached background surface,
+    agents, bullets and flags are persistent sprites that are only touched when their tile changes.
+    Each frame only the changed tiles are redrawn and pushed to the display with `display.update(rects)`.
+
+    Args:
+        screen ( pygame.Surface ): the display surface
+        tile_images ( dict ): character from ASCII_TILES -> image, must contain the wall
+        wall ( str ): character of the wall tile
+    """
+
+    def __init__(self, screen, tile_images, wall):
+        self.screen = screen
+        self.tile_images = tile_images
+        self.wall = wall
+        self.background = None
+        self.sprites = {}  # (x, y) -> sprite of the object on that tile
+        self.unused = []   # sprites of objects that are gone, reused for new ones
+
+    def _build_background(self, worldmap_buffer):
+        # walls never move, the buffer always has them where the static map has them
+        self.background = pygame.Surface(self.screen.get_size()).convert()
+        self.background.fill((0, 0, 0))
+        image = self.tile_images[self.wall]
+        for y, row in enumerate(worldmap_buffer):
+            for x, tile in enumerate(row):
+                if tile == self.wall:
+                    self.background.blit(image, (x * TILE_SIZE, y * TILE_SIZE))
+
+    def _set_tile(self, x, y, tile):
+        sprite = self.sprites.pop((x, y), None)
+        if tile == self.wall or tile not in self.tile_images:
+            if sprite:
+                self.unused.append(sprite)
+            return
+        if not sprite:
+            sprite = self.unused.pop() if self.unused else Sprite(self.tile_images[tile])
+        sprite.image = self.tile_images[tile]
+        sprite.rect.x = x * TILE_SIZE
+        sprite.rect.y = y * TILE_SIZE
+        self.sprites[(x, y)] = sprite
+
+    def draw(self, worldmap_buffer, dirty_tiles = None):
+        """
+        Brings the screen up to date with the buffer.
+
+        Args:
+            worldmap_buffer ( list of lists ): the buffered worldmap (or anything indexable as [y][x])
+            dirty_tiles ( set ): (x, y) of tiles that changed since the last call, None redraws everything
+        """
+        if self.background is None or dirty_tiles is None:
+            if self.background is None:
+                self._build_background(worldmap_buffer)
+            self.unused.extend(self.sprites.values())
+            self.sprites = {}
+            for y, row in enumerate(worldmap_buffer):
+                for x, tile in enumerate(row):
+                    self._set_tile(x, y, tile)
+            self.screen.blit(self.background, (0, 0))
+            for sprite in self.sprites.values():
+                self.screen.blit(sprite.image, sprite.rect)
+            pygame.display.flip()
+            return
+
+        rects = []
+        for x, y in dirty_tiles:
+            self._set_tile(x, y, worldmap_buffer[y][x])
+            rect = pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+            self.screen.blit(self.background, rect, rect)
+            sprite = self.sprites.get((x, y))
+            if sprite:
+                self.screen.blit(sprite.image, sprite.rect)
+            rects.append(rect)
+        if rects:
+            pygame.display.update(rects)
@@ -0,0 +1,313 @@
+"""
+Recording and playback of games.
+
+A replay stores the generated worldmap, flag and spawn positions and, for every tick, the tiles that
+changed since the previous tick, the agents' actions and the bullets that were fired. Any frame can be
+rebuilt from the file without loading the agents (blue_agent.py / red_agent.py) or running the game again.
+
+File layout (all integers little endian):
+    header:  b"CTFR", u8 version, u8 flags (bit 0 -> payload is zlib compressed), u16 height, u16 width
+    payload: worldmap (height*width tile codes)
+             u8 number of flags,  per flag:  u8 color, varint x, varint y
+             u8 number of agents, per agent: u8 color, u8 index, varint x, varint y
+             varint number of frames, per frame:
+                 varint number of changed tiles, per tile: varint gap to previous changed cell, u8 tile code
+                 u8 number of actions, per action: u8 agent, u8 action << 4 | direction
+                 u8 number of bullets, per bullet: u8 agent, varint cell, u8 direction
+             u8 winner
+
+Usage:
+    python replay.py game.ctfr              # print every frame as ascii
+    python replay.py game.ctfr --frame 120  # print a single frame
+"""
+
+from config import *
+
+import argparse
+import struct
+import time
+import zlib
+
+MAGIC = b"CTFR"
+VERSION = 1
+COMPRESSED = 1
+KEYFRAME_INTERVAL = 256
+
+COLORS = ["blue", "red"]
+ACTIONS = [None, "move", "shoot"]
+DIRECTIONS = [None, "up", "down", "left", "right"]
+BULLET_DIRECTIONS = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+WINNERS = ["", "blue", "red", "tied"]
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class ReplayRecorder:
+    """
+    Records a game tick by tick. Call `start` after `World.generate_world`, `record` after every tick
+    and `finish` when the game is over, then `save` (or `to_bytes`).
+    """
+
+    def __init__(self, compress = True):
+        self.compress = compress
+        self.data = bytearray()
+        self.frames = 0
+        self.agent_ids = {}
+        self.bullets = []
+        self.previous = None
+
+    def start(self, world):
+        self.height = world.height
+        self.width = world.width
+        self.previous = bytearray(TILE_CODES[tile] for row in world.worldmap for tile in row)
+        self.data += self.previous
+
+        self.data.append(len(world.flags))
+        for flag in world.flags:
+            self.data.append(COLORS.index(flag.color))
+            _write_varint(self.data, flag.position[0])
+            _write_varint(self.data, flag.position[1])
+
+        self.data.append(len(world.agents))
+        for agent_id, agent in enumerate(world.agents):
+            self.agent_ids[(agent.color, agent.index)] = agent_id
+            self.data.append(COLORS.index(agent.color))
+            self.data.append(agent.index)
+            _write_varint(self.data, agent.position[0])
+            _write_varint(self.data, agent.position[1])
+
+        self.frames_data = bytearray()
+
+    def record(self, world):
+        frame = self.frames_data
+        buffer = world.worldmap_buffer
+        if world.dirty_tiles is None:
+            current = bytearray(TILE_CODES[tile] for row in buffer for tile in row)
+            changed = [(cell, current[cell]) for cell in range(len(current)) if current[cell] != self.previous[cell]]
+        else:
+            changed = sorted((y * self.width + x, TILE_CODES[buffer[y][x]]) for x, y in world.dirty_tiles)
+        _write_varint(frame, len(changed))
+        last = 0
+        for cell, code in changed:
+            _write_varint(frame, cell - last)
+            frame.append(code)
+            last = cell
+
+        # agents only act every fifth tick (see main.main)
+        agent_tick = (world.tick - 1) % 5 == 0
+        actions = [agent for agent in world.agents if agent_tick and agent.last_action != (None, None)]
+        frame.append(len(actions))
+        for agent in actions:
+            action, direction = agent.last_action
+            frame.append(self.agent_ids[(agent.color, agent.index)])
+            frame.append(ACTIONS.index(action) << 4 | DIRECTIONS.index(direction))
+
+        known = set(id(bullet) for bullet in self.bullets)
+        fired = [bullet for bullet in world.bullets if id(bullet) not in known]
+        self.bullets = list(world.bullets)
+        frame.append(len(fired))
+        for bullet in fired:
+            frame.append(self.agent_ids[bullet.shooter])
+            _write_varint(frame, bullet.position[1] * self.width + bullet.position[0])
+            frame.append(BULLET_DIRECTIONS.index(bullet.direction))
+
+        self.frames += 1
+
+    def finish(self, world):
+        self.winner = world.win
+
+    def to_bytes(self):
+        payload = bytearray(self.data)
+        _write_varint(payload, self.frames)
+        payload += self.frames_data
+        payload.append(WINNERS.index(getattr(self, "winner", "")))
+
+        flags = 0
+        if self.compress:
+            payload = zlib.compress(bytes(payload), 9)
+            flags |= COMPRESSED
+        return MAGIC + struct.pack("<BBHH", VERSION, flags, self.height, self.width) + bytes(payload)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+
+class ReplayFrame:
+    """
+    One rebuilt frame. Has the attributes the renderer in main.py and `World.ascii_display` read.
+    """
+
+    def __init__(self, tick, height, width, worldmap_buffer, dirty_tiles):
+        self.tick = tick
+        self.height = height
+        self.width = width
+        self.worldmap_buffer = worldmap_buffer
+        self.dirty_tiles = dirty_tiles  # (x, y) of tiles that changed since the previous frame
+
+    def ascii_display(self):
+        print("\n" + "=="*len(self.worldmap_buffer[0]) + "=\n")
+        for row in self.worldmap_buffer:
+            print(" " + " ".join(row))
+
+
+class ReplayPlayer:
+    """
+    Reads a replay and rebuilds any of its frames. Every KEYFRAME_INTERVAL frames a full copy of the map
+    is kept, so a random frame costs at most KEYFRAME_INTERVAL deltas.
+    """
+
+    def __init__(self, data):
+        if data[:4] != MAGIC:
+            raise ValueError("not a replay file")
+        version, flags, self.height, self.width = struct.unpack_from("<BBHH", data, 4)
+        if version != VERSION:
+            raise ValueError(f"unsupported replay version {version}")
+        payload = data[10:]
+        if flags & COMPRESSED:
+            payload = zlib.decompress(payload)
+        self._parse(payload)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def _parse(self, payload):
+        size = self.height * self.width
+        self.worldmap = [[CODE_TILES[code] for code in payload[row*self.width:(row+1)*self.width]] for row in range(self.height)]
+        offset = size
+
+        self.flags = []
+        count = payload[offset]
+        offset += 1
+        for _ in range(count):
+            color = COLORS[payload[offset]]
+            x, offset = _read_varint(payload, offset + 1)
+            y, offset = _read_varint(payload, offset)
+            self.flags.append((color, (x, y)))
+
+        self.agents = []
+        count = payload[offset]
+        offset += 1
+        for _ in range(count):
+            color = COLORS[payload[offset]]
+            index = payload[offset + 1]
+            x, offset = _read_varint(payload, offset + 2)
+            y, offset = _read_varint(payload, offset)
+            self.agents.append((color, index, (x, y)))
+
+        self.deltas = []   # per frame: list of (cell, tile code)
+        self.actions = []  # per frame: list of (agent, action, direction)
+        self.shots = []    # per frame: list of (agent, (x, y), (dx, dy))
+        self.keyframes = []
+        current = bytearray(payload[:size])
+        frames, offset = _read_varint(payload, offset)
+        for frame in range(frames):
+            if frame % KEYFRAME_INTERVAL == 0:
+                self.keyframes.append(bytes(current))
+
+            changed, offset = _read_varint(payload, offset)
+            delta = []
+            cell = 0
+            for _ in range(changed):
+                gap, offset = _read_varint(payload, offset)
+                cell += gap
+                delta.append((cell, payload[offset]))
+                current[cell] = payload[offset]
+                offset += 1
+            self.deltas.append(delta)
+
+            actions = []
+            count = payload[offset]
+            offset += 1
+            for _ in range(count):
+                agent, packed = payload[offset], payload[offset + 1]
+                actions.append((agent, ACTIONS[packed >> 4], DIRECTIONS[packed & 0xf]))
+                offset += 2
+            self.actions.append(actions)
+
+            shots = []
+            count = payload[offset]
+            offset += 1
+            for _ in range(count):
+                agent = payload[offset]
+                cell, offset = _read_varint(payload, offset + 1)
+                shots.append((agent, (cell % self.width, cell // self.width), BULLET_DIRECTIONS[payload[offset]]))
+                offset += 1
+            self.shots.append(shots)
+
+        self.winner = WINNERS[payload[offset]]
+
+    def __len__(self):
+        return len(self.deltas)
+
+    def frame(self, tick):
+        """
+        Rebuilds the buffered worldmap as it was during `tick`.
+
+        Returns:
+            ReplayFrame
+        """
+        if not 0 <= tick < len(self.deltas):
+            raise IndexError(f"replay has {len(self.deltas)} frames")
+        keyframe = tick // KEYFRAME_INTERVAL
+        current = bytearray(self.keyframes[keyframe])
+        for frame in range(keyframe * KEYFRAME_INTERVAL, tick + 1):
+            for cell, code in self.deltas[frame]:
+                current[cell] = code
+        return self._frame(tick, current)
+
+    def frames(self):
+        """
+        Yields every frame in order, applying one delta per frame.
+        """
+        current = bytearray(self.keyframes[0]) if self.keyframes else bytearray()
+        for tick, delta in enumerate(self.deltas):
+            for cell, code in delta:
+                current[cell] = code
+            yield self._frame(tick, current)
+
+    def _frame(self, tick, current):
+        width = self.width
+        worldmap_buffer = [[CODE_TILES[code] for code in current[row*width:(row+1)*width]] for row in range(self.height)]
+        changed = [(cell % width, cell // width) for cell, _ in self.deltas[tick]]
+        return ReplayFrame(tick, self.height, self.width, worldmap_buffer, changed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print a recorded game as ascii.")
+    parser.add_argument("path")
+    parser.add_argument("--frame", type=int, default=None, help="print only this frame")
+    parser.add_argument("--delay", type=float, default=TICK_RATE, help="seconds between frames")
+    args = parser.parse_args()
+
+    player = ReplayPlayer.load(args.path)
+    if args.frame is not None:
+        player.frame(args.frame).ascii_display()
+        return
+    for frame in player.frames():
+        frame.ascii_display()
+        time.sleep(args.delay)
+    print(f"\n{player.winner or 'nobody'} won after {len(player)} ticks\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Hooks the team modules (blue_agent.py, red_agent.py, ...) register for the engine to call, so tournament.py
+doesn't have to know what state a team keeps between games. A module registers when it is imported:
+
+    import team_hooks
+    team_hooks.register("blue", new_match=reset_knowlage_base, agent_tick_done=publish_knowlage)
+
+Registering a team again replaces its hooks, so importing a module twice doesn't call them twice.
+"""
+
+new_match_hooks = {}   # team -> called before every game, the team starts it from scratch
+agent_tick_hooks = {}  # team -> called with the world tick once every agent acted in it
+
+
+def register(team, new_match = None, agent_tick_done = None):
+    """
+    Args:
+        team ( str ): color of the team, "blue" or "red"
+        new_match ( callable ): called without arguments before every game (see World.generate_world)
+        agent_tick_done ( callable ): called with the world tick after all agents acted in it (see World.update_agents)
+    """
+    if new_match is not None:
+        new_match_hooks[team] = new_match
+    if agent_tick_done is not None:
+        agent_tick_hooks[team] = agent_tick_done
+
+
+def start_match():
+    """
+    Calls the new_match hook of every registered team
+    """
+    for hook in list(new_match_hooks.values()):
+        hook()
+
+
+def end_agent_tick(tick):
+    """
+    Calls the agent_tick_done hook of every registered team
+
+    Args:
+        tick ( int ): world tick the agents just acted in
+    """
+    for hook in list(agent_tick_hooks.values()):
+        hook(tick)
@@ -1,26 +1,44 @@
 from blue_agent import Agent as B_agent
 from red_agent import Agent as R_agent
+import team_hooks
 from config import *
+from clock import RealTimeClock
+from grid import NumpyGrid
+from vision import VisionCache
+from occupancy import Occupancy
 
-import time
 import random
 import copy
 
 class World:
 
-    def __init__(self, height, width, tick_rate):
+    def __init__(self, height, width, tick_rate, clock = None, grid_backend = "list", wall_density = WALL_DENSITY):
         self.height = height
         self.width = width
         self.tick_rate = tick_rate
+        self.wall_density = wall_density
+        # decides how long a tick takes, by default waits `tick_rate` seconds (see clock.py)
+        self.clock = clock if clock else RealTimeClock(tick_rate)
         
         self.tick = 0
         self.worldmap = None
         self.worldmap_buffer = None
+        self.buffered_tiles = {}
+        self.dirty_tiles = None
+        # "list" keeps the maps as lists of characters, "numpy" stores them as tile codes (see grid.py)
+        self.grid_backend = grid_backend
+        self.grid = None
+        self.vision = None
         self.win = ""
         
         self.agents = []
         self.flags = []
         self.bullets = []
+        # agents by tile and flags nobody holds by tile (as they were when the buffer was drawn)
+        self.occupancy = Occupancy()
+        self.flag_cells = {}
+        # flag pickups, drops and captures in the order they happened
+        self.flag_events = []
     
     def _clear_area(self, x, y):
         for yi in [-1, 0, 1]:
@@ -29,23 +47,23 @@ class World:
     
     def _clear_random_path(self, flag_blue_pos, flag_red_pos):
         position = flag_blue_pos
-        while position[0] < (WIDTH+1)/2:
+        while position[0] < (self.width+1)/2:
             self.worldmap[position[1]][position[0]] = ASCII_TILES["empty"]
             r = random.random()
             if r > 0.75 and position[1] > 3:
                 position = (position[0], position[1]-1)
-            elif r > 0.5 and position[1] < HEIGHT-4:
+            elif r > 0.5 and position[1] < self.height-4:
                 position = (position[0], position[1]+1)
             else:
                 position = (position[0]+1, position[1])
         position_left = position
         position = flag_red_pos
-        while position[0] > (WIDTH-1)/2:
+        while position[0] > (self.width-1)/2:
             self.worldmap[position[1]][position[0]] = ASCII_TILES["empty"]
             r = random.random()
             if r > 0.75 and position[1] > 3:
                 position = (position[0], position[1]-1)
-            elif r > 0.5 and position[1] < HEIGHT-4:
+            elif r > 0.5 and position[1] < self.height-4:
                 position = (position[0], position[1]+1)
             else:
                 position = (position[0]-1, position[1])
@@ -62,14 +80,15 @@ class World:
             do_vertical_line = False
         if do_vertical_line:
             for yi in range(beg_y, end_y):
-                self.worldmap[yi][WIDTH//2] = ASCII_TILES["empty"]
+                self.worldmap[yi][self.width//2] = ASCII_TILES["empty"]
 
     def generate_world(self):
+        reset_match_state()
         self.worldmap = [[ASCII_TILES["empty"] for _ in range(self.width)] for _ in range(self.height)]
 
         for y in range(len(self.worldmap)):
             for x in range(len(self.worldmap[0])):
-                if random.random() > 0.7 and (y != 1 and y != self.height-2):
+                if random.random() > 1 - self.wall_density and (y != 1 and y != self.height-2):
                     self.worldmap[y][x] = ASCII_TILES["wall"]
                 if x == 0 or x == self.width-1 or y == 0 or y == self.height-1:
                     self.worldmap[y][x] = ASCII_TILES["wall"]
@@ -102,13 +121,54 @@ class World:
 
         self._clear_random_path(flag_blue_pos, flag_red_pos)
 
+        if self.grid_backend == "numpy":
+            self.grid = NumpyGrid(self.worldmap)
+        # walls don't move from now on, vision masks are computed once per position
+        self.vision = VisionCache(self.worldmap)
+        for agent in self.agents:
+            self.occupancy.add(agent)
+
+    def is_wall(self, x, y):
+        if self.grid:
+            return self.grid.is_wall(x, y)
+        return self.worldmap[y][x] == ASCII_TILES["wall"]
+
+    # worldmap with bullets, agents and flags drawn over it
+    #   only the tiles that objects left or entered since the last tick are rewritten, they are
+    #   stored in `dirty_tiles` as (x, y) (None after the first buffering, when everything is new)
     def buffer_worldmap(self):
-        self.worldmap_buffer = copy.deepcopy(self.worldmap)
+        tiles = {}
         for obj in self.bullets + self.agents:
-            self.worldmap_buffer[obj.position[1]][obj.position[0]] = obj.ascii_tile
+            tiles[obj.position] = obj.ascii_tile
+        self.flag_cells = {}
         for flag in self.flags:
             if not flag.agent_holding:
-                self.worldmap_buffer[flag.position[1]][flag.position[0]] = flag.ascii_tile
+                tiles[flag.position] = flag.ascii_tile
+                self.flag_cells[flag.position] = flag
+
+        if self.worldmap_buffer is None:
+            if self.grid:
+                self.worldmap_buffer = self.grid.view
+            else:
+                self.worldmap_buffer = copy.deepcopy(self.worldmap)
+            self.buffered_tiles = {}
+            self.dirty_tiles = None
+        else:
+            self.dirty_tiles = set()
+
+        restore = [position for position in self.buffered_tiles if position not in tiles]
+        draw = {position: tile for position, tile in tiles.items() if self.buffered_tiles.get(position) != tile}
+        if self.grid:
+            self.grid.overlay(restore, draw)
+        else:
+            for x, y in restore:
+                self.worldmap_buffer[y][x] = self.worldmap[y][x]
+            for (x, y), tile in draw.items():
+                self.worldmap_buffer[y][x] = tile
+        if self.dirty_tiles is not None:
+            self.dirty_tiles.update(restore)
+            self.dirty_tiles.update(draw)
+        self.buffered_tiles = tiles
 
     def ascii_display(self):
         #os.system("clear")  # linux: "clear", windows: "cls"
@@ -117,21 +177,36 @@ class World:
             print(" " + " ".join(row))
 
     def iter(self):
-        time.sleep(self.tick_rate)
+        self.clock.tick()
         self.tick += 1
+
+    def add_flag_event(self, event, flag, agent):
+        self.flag_events.append({"tick": self.tick, "event": event, "flag": flag.color, "agent": (agent.color, agent.index)})
     
     def update_agents(self):
         for agent in self.agents:
             agent.control(self)
+        # each team publishes what its agents learned this tick, see knowledge_feed.py
+        team_hooks.end_agent_tick(self.tick)
         for agent in self.agents:
             agent.collision(self)
             agent.update_can_shoot()
+            self.occupancy.move(agent)
+
+    def agents_at(self, position):
+        return self.occupancy.agents_at(position)
     
     def update_bullets(self):
+        holding = [flag.agent_holding for flag in self.flags]
+        walls_ahead = self.grid.walls_ahead(self.bullets) if self.grid else None
         for i in range(len(self.bullets)-1, -1, -1):
-            hit = self.bullets[i].update(self.worldmap_buffer, self.agents)
+            hit = self.bullets[i].update(self.worldmap_buffer, self.agents, walls_ahead[i] if walls_ahead else None, self.occupancy)
             if hit:
                 del self.bullets[i]
+        # agent carrying a flag was shot
+        for flag, agent in zip(self.flags, holding):
+            if agent and not flag.agent_holding:
+                self.add_flag_event("drop", flag, agent)
     
     def check_win_state(self):
         blue_count = 0
@@ -153,6 +228,13 @@ class World:
             agent.terminate(reason = self.win)
 
 
+# team modules keep their state in module globals, each one resets it in its new_match hook (see team_hooks.py)
+def reset_match_state():
+    team_hooks.start_match()
+    AgentEngine.blue_index = 0
+    AgentEngine.red_index = 0
+
+
 class Flag:
 
     def __init__(self, color, position):
@@ -170,50 +252,43 @@ class Bullet:
 
     def __init__(self, agent, direction):
         self.color = agent.color
+        self.shooter = (agent.color, agent.index)
         self.direction = direction
         self.position = agent.position
         self.ascii_tile = ASCII_TILES["bullet"]
     
     # bullet movement and collision (with walls or players)
-    def update(self, worldmap_buffer, agents):
-        for i in range(len(agents)-1, -1, -1):
-            if agents[i].position == self.position and agents[i].color != self.color:
-                agents[i].terminate(reason = "died")
-                del agents[i]
-                return True
+    # `wall_ahead` can be precomputed for all bullets at once (numpy grid), otherwise it's read from the buffer
+    # `occupancy` (see occupancy.py) finds the agent on the bullet's tile without scanning all agents
+    def update(self, worldmap_buffer, agents, wall_ahead = None, occupancy = None):
+        if self.hit(agents, occupancy):
+            return True
                 
         self.position = (self.position[0] + self.direction[0], self.position[1] + self.direction[1])
         
-        tile = worldmap_buffer[self.position[1]][self.position[0]]
-        if tile == ASCII_TILES["wall"]:
+        if wall_ahead is None:
+            wall_ahead = worldmap_buffer[self.position[1]][self.position[0]] == ASCII_TILES["wall"]
+        if wall_ahead:
             return True
-        for i in range(len(agents)-1, -1, -1):
-            if agents[i].position == self.position and agents[i].color != self.color:
-                agents[i].terminate(reason = "died")
-                del agents[i]
-                return True
-        return False
+        return self.hit(agents, occupancy)
 
+    # kills an enemy standing on the bullet's tile (friendly fire is ignored)
+    def hit(self, agents, occupancy):
+        if occupancy is None:
+            for i in range(len(agents)-1, -1, -1):
+                if agents[i].position == self.position and agents[i].color != self.color:
+                    agents[i].terminate(reason = "died")
+                    del agents[i]
+                    return True
+            return False
 
-# returns coordinates of tiles between two locations (line of sight)
-def _bresenham_line(x1, y1, x2, y2):
-    dx = abs(x2 - x1)
-    dy = abs(y2 - y1)
-    sx = 1 if x1 < x2 else -1
-    sy = 1 if y1 < y2 else -1
-    err = dx - dy
-
-    while x1 != x2 or y1 != y2:
-        yield x1, y1
-        e2 = err * 2
-        
-        if e2 > -dy:
-            err -= dy
-            x1 += sx
-            
-        if e2 < dx:
-            err += dx
-            y1 += sy
+        agent = occupancy.enemy_at(self.position, self.color, agents)
+        if agent:
+            agent.terminate(reason = "died")
+            agents.remove(agent)
+            occupancy.remove(agent)
+            return True
+        return False
 
 
 class AgentEngine:
@@ -231,6 +306,8 @@ class AgentEngine:
         self.CAN_SHOOT_DELAY = 3
         
         self.holding_flag = None
+        # what agent.update returned last agent tick (replays record it)
+        self.last_action = (None, None)
 
         if self.color == "blue":
             self.index = AgentEngine.blue_index
@@ -249,35 +326,14 @@ class AgentEngine:
         self.agent.terminate(reason)
     
     def get_visible_world(self, world):
-        max_distance = 4
-        visible_world = []
-        
-        ## the square of world within max_distance of the agent
-        for y in range(0, max_distance*2+1):
-            y_world = self.position[1] + y - max_distance
-            visible_world.append([])
-            for x in range(0, max_distance*2+1):
-                x_world = self.position[0] + x - max_distance
-                if x_world >= 0 and x_world < world.width and y_world >= 0 and y_world < world.height:
-                    visible_world[-1].append(world.worldmap_buffer[y_world][x_world])
-                else:
-                    visible_world[-1].append(ASCII_TILES["unknown"])
-                    
-        ## obstructed vision of the world - line of sight
-        agent_x, agent_y = max_distance, max_distance
-        for y in range(len(visible_world)):
-            for x in range(len(visible_world[0])):
-                for x_online, y_online in _bresenham_line(agent_x, agent_y, x, y):
-                    tile = visible_world[y_online][x_online]
-                    if tile == ASCII_TILES["wall"]:
-                        visible_world[y][x] = ASCII_TILES["unknown"]
-                        break
-        
-        return visible_world
+        if world.grid:
+            return world.grid.visible_world(self.position, world.vision.hidden_array(self.position))
+        return world.vision.visible_world(self.position, world.worldmap_buffer)
     
     # controlling movement and shooting from blue_agent.py and red_agent.py
     def control(self, world):
         action, direction = self.agent.update(self.get_visible_world(world), self.position, self.can_shoot, self.holding_flag)
+        self.last_action = (action, direction)
 
         if action == "move":
             self.prev_position = self.position
@@ -300,29 +356,35 @@ class AgentEngine:
         y = self.position[1]
         
         # collision with walls
-        if world.worldmap[y][x] == ASCII_TILES["wall"]:
+        if world.is_wall(x, y):
             self.position = self.prev_position
         
         # flag capturing / collision
         elif self.color == "blue":
-            if world.worldmap_buffer[y][x] == ASCII_TILES["red_flag"] and not world.flags[1].agent_holding:
+            flag = world.flag_cells.get((x, y))
+            if flag is world.flags[1] and not world.flags[1].agent_holding:
                 self.holding_flag = world.flags[1]
                 world.flags[1].agent_holding = self
                 self.ascii_tile = ASCII_TILES["blue_agent_f"]
-            elif world.worldmap_buffer[y][x] == ASCII_TILES["blue_flag"]:
+                world.add_flag_event("pickup", self.holding_flag, self)
+            elif flag is world.flags[0]:
                 if self.holding_flag:
                     world.win = "blue"
+                    world.add_flag_event("capture", self.holding_flag, self)
                 else:  # collision
                     self.position = self.prev_position
                 
         elif self.color == "red":
-            if world.worldmap_buffer[y][x] == ASCII_TILES["blue_flag"] and not world.flags[0].agent_holding:
+            flag = world.flag_cells.get((x, y))
+            if flag is world.flags[0] and not world.flags[0].agent_holding:
                 self.holding_flag = world.flags[0]
                 world.flags[0].agent_holding = self
                 self.ascii_tile = ASCII_TILES["red_agent_f"]
-            elif world.worldmap_buffer[y][x] == ASCII_TILES["red_flag"]:
+                world.add_flag_event("pickup", self.holding_flag, self)
+            elif flag is world.flags[1]:
                 if self.holding_flag:
                     world.win = "red"
+                    world.add_flag_event("capture", self.holding_flag, self)
                 else:  # collision
                     self.position = self.prev_position
     
@@ -0,0 +1,167 @@
+"""
+Line of sight for the agents' 9x9 vision.
+
+Walls never move after `World.generate_world`, so which tiles of the window are hidden depends only on
+the agent's position. The rays from the centre of the window to each of its tiles are computed once
+(RAYS) and `VisionCache` keeps one visibility mask per position, so vision is a gather from the buffer.
+"""
+
+from config import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+VISION_RADIUS = 4
+VISION_SIZE = VISION_RADIUS*2 + 1
+
+
+# returns coordinates of tiles between two locations (line of sight)
+def _bresenham_line(x1, y1, x2, y2):
+    dx = abs(x2 - x1)
+    dy = abs(y2 - y1)
+    sx = 1 if x1 < x2 else -1
+    sy = 1 if y1 < y2 else -1
+    err = dx - dy
+
+    while x1 != x2 or y1 != y2:
+        yield x1, y1
+        e2 = err * 2
+
+        if e2 > -dy:
+            err -= dy
+            x1 += sx
+
+        if e2 < dx:
+            err += dx
+            y1 += sy
+
+
+# tiles between the centre of the window and each of its tiles, in the order they are checked (row by row)
+RAYS = [(x, y, tuple(_bresenham_line(VISION_RADIUS, VISION_RADIUS, x, y))) for y in range(VISION_SIZE) for x in range(VISION_SIZE)]
+
+
+def line_of_sight(walls):
+    """
+    Which tiles of a vision window are hidden behind walls. Works exactly like the original
+    `AgentEngine.get_visible_world`: tiles are checked row by row and a wall that is already
+    hidden doesn't block anything anymore.
+
+    Args:
+        walls ( list of lists of bools ): True where the window has a wall
+
+    Returns:
+        hidden ( list of lists of bools ): True where the tile is hidden
+    """
+    walls = [row[:] for row in walls]
+    hidden = [[False for _ in range(VISION_SIZE)] for _ in range(VISION_SIZE)]
+    for x, y, ray in RAYS:
+        for x_online, y_online in ray:
+            if walls[y_online][x_online]:
+                hidden[y][x] = True
+                walls[y][x] = False
+                break
+    return hidden
+
+
+def reference_visible_world(worldmap_buffer, width, height, position):
+    """
+    The original vision code (walks a Bresenham line to every tile), kept to check and benchmark against.
+    """
+    max_distance = VISION_RADIUS
+    visible_world = []
+
+    ## the square of world within max_distance of the agent
+    for y in range(0, max_distance*2+1):
+        y_world = position[1] + y - max_distance
+        visible_world.append([])
+        for x in range(0, max_distance*2+1):
+            x_world = position[0] + x - max_distance
+            if x_world >= 0 and x_world < width and y_world >= 0 and y_world < height:
+                visible_world[-1].append(worldmap_buffer[y_world][x_world])
+            else:
+                visible_world[-1].append(ASCII_TILES["unknown"])
+
+    ## obstructed vision of the world - line of sight
+    agent_x, agent_y = max_distance, max_distance
+    for y in range(len(visible_world)):
+        for x in range(len(visible_world[0])):
+            for x_online, y_online in _bresenham_line(agent_x, agent_y, x, y):
+                tile = visible_world[y_online][x_online]
+                if tile == ASCII_TILES["wall"]:
+                    visible_world[y][x] = ASCII_TILES["unknown"]
+                    break
+
+    return visible_world
+
+
+class VisionCache:
+    """
+    Visibility masks of the static worldmap, one per agent position.
+
+    Args:
+        worldmap ( list of lists ): the static map (without agents, bullets and flags)
+        eager ( bool ): compute the masks of all positions now instead of on first use
+    """
+
+    def __init__(self, worldmap, eager = False):
+        self.height = len(worldmap)
+        self.width = len(worldmap[0])
+        self.walls = [[tile == ASCII_TILES["wall"] for tile in row] for row in worldmap]
+        self.rows = {}
+        self.arrays = {}
+        if eager:
+            for y in range(self.height):
+                for x in range(self.width):
+                    self.visible_rows((x, y))
+
+    def hidden(self, position):
+        """
+        Mask of the window around `position`, True for tiles hidden behind walls. Tiles outside the
+        map are never walls (the agents see them as unknown anyway).
+        """
+        x0 = position[0] - VISION_RADIUS
+        y0 = position[1] - VISION_RADIUS
+        walls = [[0 <= y0 + y < self.height and 0 <= x0 + x < self.width and self.walls[y0 + y][x0 + x]
+                  for x in range(VISION_SIZE)] for y in range(VISION_SIZE)]
+        return line_of_sight(walls)
+
+    def visible_rows(self, position):
+        """
+        For every row of the window that is inside the map: the world row and the (window column,
+        world column) pairs of its visible tiles.
+        """
+        rows = self.rows.get(position)
+        if rows is None:
+            hidden = self.hidden(position)
+            x0 = position[0] - VISION_RADIUS
+            y0 = position[1] - VISION_RADIUS
+            rows = []
+            for y in range(VISION_SIZE):
+                if 0 <= y0 + y < self.height:
+                    cells = tuple((x, x0 + x) for x in range(VISION_SIZE) if 0 <= x0 + x < self.width and not hidden[y][x])
+                    rows.append((y, y0 + y, cells))
+            self.rows[position] = rows
+        return rows
+
+    def hidden_array(self, position):
+        """
+        `hidden` as a numpy array, for the numpy grid backend.
+        """
+        mask = self.arrays.get(position)
+        if mask is None:
+            mask = self.arrays[position] = np.array(self.hidden(position), dtype=bool)
+        return mask
+
+    def visible_world(self, position, worldmap_buffer):
+        """
+        The agent's vision: the buffer where the agent can see, unknown everywhere else.
+        """
+        visible_world = [[ASCII_TILES["unknown"]] * VISION_SIZE for _ in range(VISION_SIZE)]
+        for y, y_world, cells in self.visible_rows(position):
+            row = visible_world[y]
+            row_world = worldmap_buffer[y_world]
+            for x, x_world in cells:
+                row[x] = row_world[x_world]
+        return visible_world